@@ -1,32 +1,28 @@
 import json
-from huggingface_hub import InferenceClient
-import streamlit as st
 import os
 from dotenv import load_dotenv
-import re
-import docker
-import uuid
-import tempfile
-from sentence_transformers import SentenceTransformer, util
-import time
-import torch
+from Llm_Gateway import chat_completion, stream_completion
+from Json_Stream import QuestionStreamParser, StreamError, loads_tolerant
+from Questions import parse_question, parse_answer_list, normalize_text
+from Sandbox_Harness import prepare_tests
+from Embedding_Service import cosine_rows, get_embedding_service
+from Short_Answer_Filter import LEXICAL_FILTER, get_tier_stats, lexical_verdict
+from Evaluator_Core import EvaluationSession
+from Sandbox_Backends import SandboxIsolationError, get_sandbox_backend
+from Sandbox_Runner import SandboxUnavailable, run_submission, sandbox_slot
+from Sandbox_Cache import submission_key, get_cached_result, store_result
 
 
 load_dotenv()
-# === Setup Inference Client ===
-client = InferenceClient(provider="fireworks-ai", api_key=os.getenv("hf_token"))
-def query_llm(prompt):
-    # prompt = json.dumps({"messages": messages, "actions": actions or []})
-    try:
-        completion = client.chat.completions.create(
-            model="meta-llama/Llama-3.1-8B-Instruct",
-            messages=[
-                {"role": "system", "content": prompt}
-            ],
-        )
-        return completion.choices[0].message["content"]
-    except:
-        return {'Error generating the question.'}
+def query_llm(prompt, cache: bool = True, parse=None):
+    # Failures surface as LlmError after the gateway's retries instead of a placeholder value
+    return chat_completion(
+        messages=[
+            {"role": "system", "content": prompt}
+        ],
+        cache=cache,
+        parse=parse,
+    )
 
 
 def extract_json(raw_response: str):
@@ -45,16 +41,58 @@ def extract_json(raw_response: str):
             after = after[:-3].strip()
 
         raw = after
-    raw = raw.replace(": None", ": null")
-    # Attempt JSON parsing
+    # Attempt JSON parsing (tolerates None/True/False, // comments and trailing commas)
     try:
-        return json.loads(raw)
+        return loads_tolerant(raw)
     except json.JSONDecodeError as e:
         print(f"Failed to parse JSON:\n{e}\n\nContent:\n{raw}")
         raise ValueError(f"Error in generating the question please restart the test.")
 
 
-def generate_tags(topic: str):
+QUESTION_ATTEMPTS = int(os.getenv("QUESTION_ATTEMPTS", 3))
+
+
+def stream_question(prompt: str, expected_type: str = None, on_question=None):
+    """Stream one question, parsing it as it arrives, and return it as a typed record.
+
+    on_question(text) fires as soon as the "question" field is complete. Reading stops at
+    the closing brace, and malformed output (bad syntax, wrong type or field) cancels the
+    stream right away and starts a fresh attempt instead of waiting for the full reply.
+    A complete object that fails validation (see Questions.parse_question) is retried too.
+    """
+    error = None
+    for attempt in range(QUESTION_ATTEMPTS):
+        parser = QuestionStreamParser(expected_type)
+        with stream_completion(messages=[{"role": "system", "content": prompt}]) as stream:
+            try:
+                for delta in stream:
+                    for key, value in parser.feed(delta):
+                        if key == "question" and on_question is not None:
+                            on_question(value)
+                    if parser.done:
+                        break
+            except StreamError as e:
+                error = e
+                print(f"Malformed question after {len(parser.buffer)} chars (attempt {attempt + 1}): {e}")
+                continue
+        try:
+            # If the stream ended before the object closed, a whole-text parse may still recover it
+            return parse_question(parser.result if parser.done else extract_json(stream.text), expected_type)
+        except ValueError as e:
+            error = e
+            print(f"Rejected question (attempt {attempt + 1}): {e}")
+    raise ValueError(f"No valid question after {QUESTION_ATTEMPTS} attempts: {error}")
+
+
+def _parse_subtopics(raw_response: str) -> list:
+    parsed = extract_json(raw_response)
+    subtopics = parsed.get("subtopics") if isinstance(parsed, dict) else None
+    if not isinstance(subtopics, list) or not subtopics or not all(isinstance(s, str) and s.strip() for s in subtopics):
+        raise ValueError("LLM reply has no subtopics list.")
+    return [s.strip() for s in subtopics]
+
+
+def generate_tags(topic: str, session: EvaluationSession = None):
     prompt = f"""
 You are a helpful assistant designed to break down a learning topic into its core subtopics.
 Given a topic, return a JSON object with two keys: "topic" and "subtopics".
@@ -76,25 +114,17 @@ Now generate for topic: {topic}
 """
 
     try:
-        raw_response = query_llm(prompt)
-        parsed = json.loads(raw_response)
-        subtopics = parsed.get("subtopics", [])
+        # Only a reply that yields subtopics is cached, so one bad reply can't pin the topic
+        subtopics = query_llm(prompt, parse=_parse_subtopics)
 
-        # Initialize beliefs in session state
-        if "beliefs" not in st.session_state:
-            st.session_state.beliefs = {}
-
-        if 'question_counts' not in st.session_state:
-            st.session_state.question_counts = {}
-
-        for tag in subtopics:
-            st.session_state.beliefs[tag] = 0.5 
-            st.session_state.question_counts[tag] = 1
+        # Beliefs live on the caller's session object, not in any UI state
+        session = session if session is not None else EvaluationSession()
+        session.start(topic, subtopics)
 
         return {
             "topic": topic,
             "tags": subtopics,
-            "beliefs": st.session_state.beliefs
+            "beliefs": session.beliefs
         }
 
     except Exception as e:
@@ -104,7 +134,7 @@ Now generate for topic: {topic}
         }
  
 
-def generate_question(tag: list,type: str, difficulty: str = "medium"):
+def generate_question(tag: list,type: str, difficulty: str = "medium", on_question=None):
     prompt = f"""
 You are a helpful assistant designed to generate **one** Python assessment question based on the given topics and type and difficulty.
 MCQ are option questions where one or more are correct 
@@ -163,100 +193,159 @@ If type == "Coding":
 """
     
     # prompt = generate_questions_prompt(tag, difficulty)
-    raw_response = ""
     try:
-        raw_response = query_llm(prompt)
-        time.sleep(1)
-        print(raw_response)
-        questions = extract_json(raw_response)
-        return questions
+        # Streamed and never cached: each call should sample a new question
+        return stream_question(prompt, expected_type=type, on_question=on_question)
     except Exception as e:
-        print(f"Failed to parse LLM response: {e}\nRaw:\n{raw_response}")
+        print(f"Failed to generate question: {e}")
         raise ValueError(f"Error in generating the question please restart the test.")
 
 
 
 def evaluate_mcq(choosen_answer: list, correct_answer: list):
     # need to count the number of corrrect options choosen
-    correct_answer = [x.strip().upper() for x in correct_answer]
+    # A "[a, b]" string is split into its answers rather than iterated character by character
+    correct_answer = {normalize_text(x) for x in parse_answer_list(correct_answer)}
     score = 0
-    for i in choosen_answer:
-        if i.strip().upper() in correct_answer:
+    for i in set(normalize_text(x) for x in choosen_answer):
+        if i in correct_answer:
             score += 1
     return score/len(correct_answer)
 
 
+SHORT_ANSWER_THRESHOLD = 0.5
+
+
+def short_answer_similarities(user_answers: list, correct_answers: list, batch_size: int = 64):
+    """Cosine similarity of each user answer to its reference answer.
+
+    Distinct texts are embedded once, in batched passes, and all pairs are scored in one
+    matrix operation. evaluate_short_answer is the one-pair case of this function, so
+    single and batch grading agree.
+    """
+    texts = list(dict.fromkeys(list(user_answers) + list(correct_answers)))
+    row = {text: i for i, text in enumerate(texts)}
+    # Reference answers recur across the cohort and the question bank; the cache embeds each once
+    embeddings = get_embedding_service().encode_cached(texts, batch_size=batch_size)
+    users = embeddings[[row[text] for text in user_answers]]
+    refs = embeddings[[row[text] for text in correct_answers]]
+    return cosine_rows(users, refs)
+
+
+def score_short_answers(user_answers: list, correct_answers: list, batch_size: int = 64, lexical: bool = LEXICAL_FILTER):
+    """0/1 scores for (user answer, reference) pairs, plus the tier that settled each one.
+
+    Empty answers, copies of the reference and stock non-answers are settled lexically;
+    only the ambiguous rest is embedded and compared at SHORT_ANSWER_THRESHOLD.
+    """
+    scores, tiers, pending = [], [], []
+    for i, (user_answer, correct_answer) in enumerate(zip(user_answers, correct_answers)):
+        score, tier = lexical_verdict(user_answer, correct_answer) if lexical else (None, "semantic")
+        scores.append(score)
+        tiers.append(tier)
+        if score is None:
+            pending.append(i)
+    if pending:
+        similarities = short_answer_similarities(
+            [user_answers[i] for i in pending], [correct_answers[i] for i in pending], batch_size=batch_size
+        )
+        for i, similarity in zip(pending, similarities):
+            scores[i] = 1 if float(similarity) >= SHORT_ANSWER_THRESHOLD else 0
+    get_tier_stats().record(tiers)
+    return scores, tiers
+
+
 def evaluate_short_answer(user_answer: str, correct_answer: str) -> int:
     """
     Compares two text answers and returns:
     - 1 if semantic similarity >= 0.5
     - 0 if similarity < 0.5
+    Clear-cut answers are settled by the lexical tiers without the model.
+    """
+    scores, _ = score_short_answers([user_answer], [correct_answer])
+    return scores[0]
+
+
+
+def grade_answer(question, answer):
+    """Score any question type in [0, 1]. Returns (score, details); details is the
+    sandbox result for Coding questions and None otherwise.
+
+    Takes a Questions record (a plain dict is parsed first); answer sets and test inputs
+    were normalized when the question was generated, so nothing is re-parsed here.
     """
-    # Compute embeddings
-    _model = SentenceTransformer("all-MiniLM-L6-v2")
-    embeddings = _model.encode([user_answer, correct_answer], convert_to_tensor=True, device='cpu')
-   
-    # Calculate cosine similarity
-    sim_score = util.pytorch_cos_sim(embeddings[0], embeddings[1]).item()
-   
-    # Debug: print score if needed
-    # print(f"Similarity score: {sim_score:.3f}")
-   
-    return 1 if sim_score >= 0.5 else 0
+    question = parse_question(question)
+    if question.type == "MCQ":
+        return question.score([answer]), None
+    if question.type == "ShortAnswer":
+        return float(evaluate_short_answer(answer, question.correct_answer)), None
+    result = run_code_in_sandbox(answer, question.tests)
+    return result.get("passed", 0) / (result.get("total") or 1), result
+
+
 
+def run_code_in_sandbox(code: str, testcases: list, mode: str = None, parallel: bool = False, fail_fast: bool = False):
+    backend = get_sandbox_backend()
+    mode = mode or backend.config.mode
+    testcases = prepare_tests(testcases)
 
+    cache_key = submission_key(code, testcases, backend.config, mode, fail_fast)
+    cached = get_cached_result(cache_key)
+    if cached is not None:
+        return cached
 
-def run_code_in_sandbox(code: str, testcases: list):
-    temp_dir = tempfile.gettempdir()
-    client = docker.from_env()
+    if mode == "harness":
+        result = run_submission(code, testcases, parallel=parallel, fail_fast=fail_fast, backend=backend)
+    else:
+        result = _run_each_test_in_sandbox(backend, code, testcases)
+    store_result(cache_key, result)
+    return result
+
+
+def _run_each_test_in_sandbox(backend, code: str, testcases: list):
+    timeout = backend.config.exec_timeout
 
     passed = 0
     failed = 0
     errors = []
 
-    for test in testcases:
-        test_input = test["input"]
-        expected_output = str(test["expected_output"]) 
-
-        filename = os.path.join(temp_dir, f"{uuid.uuid4().hex}.py")
-        with open(filename, 'w') as f:
-            f.write(code.strip() + f"\nprint(solution({test_input}))")
-
-        try:
-            result = client.containers.run(
-                image="python:3.10-slim",
-                command=f"python /code/{os.path.basename(filename)}",
-                volumes={temp_dir: {"bind": "/code", "mode": "ro"}},
-                stderr=True,
-                stdout=True,
-                network_disabled=True,
-                remove=True,
-                mem_limit="128m",
-                cpu_quota=50000,
-            )
-            result_str = result.decode().strip()
-            if result_str == expected_output:
-                passed += 1
-            else:
-                failed += 1
-                errors.append({
-                    "input": test_input,
-                    "expected": expected_output,
-                    "got": result_str
-                })
-
-        except Exception as e:
-            failed += 1
-            errors.append({
-                "input": test_input,
-                "error": str(e)
-            })
-
-        # Clean up file
-        try:
-            os.remove(filename)
-        except:
-            pass
+    # One sandbox session (a warm container, or a scratch dir locally) per submission,
+    # under the same run slots as harness mode
+    try:
+        with sandbox_slot(backend), backend.session() as sandbox:
+            for test in testcases:
+                test_input = test["input"]
+                expected_output = test["expected"]
+                source = code.strip() + f"\nprint(solution({test['call']}))"
+
+                try:
+                    exit_code, stdout, stderr = sandbox.run_python(source, timeout)
+                    if exit_code != 0:
+                        raise RuntimeError(stderr.strip() or f"Timed out after {timeout}s")
+                    result_str = stdout.strip()
+                    if result_str == expected_output:
+                        passed += 1
+                    else:
+                        failed += 1
+                        errors.append({
+                            "input": test_input,
+                            "expected": expected_output,
+                            "got": result_str
+                        })
+
+                except SandboxIsolationError as e:
+                    raise SandboxUnavailable(str(e)) from e
+                except Exception as e:
+                    failed += 1
+                    errors.append({
+                        "input": test_input,
+                        "error": str(e)
+                    })
+    except SandboxUnavailable:
+        raise
+    except Exception as e:
+        # Only getting or returning the session can fail out here; that's the host, not the code
+        raise SandboxUnavailable(f"{type(e).__name__}: {e}") from e
 
     return {
         "passed": passed,
@@ -264,26 +353,23 @@ def run_code_in_sandbox(code: str, testcases: list):
         "total": len(testcases),
         "details": errors
     }
-    return passed/len(testcases)
-
-def update_beliefs(tags: list, score: float):
-    for tag in tags:
-        n = st.session_state.question_counts[tag]
-        current_belief = st.session_state.beliefs[tag]
-
-        # Running mean formula
-        new_belief = (current_belief * n + score) / (n + 1)
-        print(new_belief)
-        # Store updated values
-        st.session_state.beliefs[tag] = new_belief
-        st.session_state.question_counts[tag] = n + 1
 
-    return st.session_state.beliefs
+def update_beliefs(tags: list, score: float, difficulty: str = None, session: EvaluationSession = None):
+    # Beta posterior per tag; the posterior mean is the belief the rest of the app reads
+    if session is None:
+        raise ValueError("update_beliefs needs the EvaluationSession to update.")
+    return session.record(tags, score, difficulty)
 
 def summarize_results(beliefs: dict):
-    strong_knowledge = [tag for tag, belief in beliefs.items() if belief > 0.7]
-    moderate_knowledge = [tag for tag, belief in beliefs.items() if 0.3 < belief <= 0.7]
-    weak_knowledge = [tag for tag, belief in beliefs.items() if belief <= 0.3]
+    # One pass over the beliefs, same thresholds as Cohort_Store.BUCKETS
+    weak_knowledge, moderate_knowledge, strong_knowledge = [], [], []
+    for tag, belief in beliefs.items():
+        if belief > 0.7:
+            strong_knowledge.append(tag)
+        elif belief > 0.3:
+            moderate_knowledge.append(tag)
+        else:
+            weak_knowledge.append(tag)
 
     return f"User has strong knowledge in {', '.join(strong_knowledge)} and User has moderate knowledge in {', '.join(moderate_knowledge)} and User has weak knowledge in {', '.join(weak_knowledge)}."
 
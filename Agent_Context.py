@@ -0,0 +1,105 @@
+import json
+
+
+def estimate_tokens(messages: list) -> int:
+    """Rough prompt size: ~4 characters per token plus a few tokens of framing per message."""
+    return sum(len(str(m.get("content", ""))) // 4 + 4 for m in messages)
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class AgentContext:
+    """Builds a bounded prompt from the agent's ever-growing message history.
+
+    The system prompt and the last `keep_turns` turns (a turn starts at each user message)
+    are sent verbatim. Older messages are folded, once, into a rolling summary of short
+    lines. Action results are collapsed to the latest value per action, so a stale belief
+    dict is never resent next to a newer one.
+    """
+
+    def __init__(self, keep_turns: int = 4, summary_chars: int = 2000):
+        self.keep_turns = keep_turns
+        self.summary_chars = summary_chars
+        self.summary_lines = []
+        self.dropped_lines = 0
+        self.folded_upto = 1          # messages[0] is the system prompt
+        self.latest_results = {}
+        self.scanned_upto = 1
+        self.token_history = []
+
+    def _fold(self, message: dict):
+        role = message.get("role")
+        content = str(message.get("content", ""))
+        if role == "action":
+            # Kept in latest_results instead
+            return
+        if role == "assistant" and "CALL:" in content:
+            line = "Called " + _clip(content.split("CALL:", 1)[1], 80)
+        elif role == "assistant":
+            line = "Asked: " + _clip(content, 160)
+        else:
+            line = "User: " + _clip(content, 100)
+        self.summary_lines.append(line)
+        # Keep the summary within budget by forgetting the oldest lines
+        while sum(len(l) + 1 for l in self.summary_lines) > self.summary_chars and len(self.summary_lines) > 1:
+            self.summary_lines.pop(0)
+            self.dropped_lines += 1
+
+    def _recent_start(self, messages: list) -> int:
+        turns = 0
+        for index in range(len(messages) - 1, 0, -1):
+            if messages[index].get("role") == "user":
+                turns += 1
+                if turns == self.keep_turns:
+                    return index
+        return 1
+
+    def build(self, messages: list) -> list:
+        """Return the prompt to send for this history and record its estimated size."""
+        for message in messages[self.scanned_upto:]:
+            if message.get("role") == "action":
+                self.latest_results[message.get("name")] = message.get("content")
+        self.scanned_upto = len(messages)
+
+        start = max(self._recent_start(messages), self.folded_upto)
+        for message in messages[self.folded_upto:start]:
+            self._fold(message)
+        self.folded_upto = start
+
+        recent = messages[start:]
+        in_recent = {m.get("name") for m in recent
+                     if m.get("role") == "action" and self.latest_results.get(m.get("name")) == m.get("content")}
+        older_results = {name: content for name, content in self.latest_results.items() if name not in in_recent}
+
+        prompt = [messages[0]]
+        if self.summary_lines or older_results:
+            parts = []
+            if self.summary_lines:
+                header = "Earlier in this evaluation"
+                if self.dropped_lines:
+                    header += f" ({self.dropped_lines} older entries omitted)"
+                parts.append(header + ":\n" + "\n".join(self.summary_lines))
+            if older_results:
+                parts.append("Latest action results:\n" + "\n".join(
+                    f"{name}: {content}" for name, content in older_results.items()
+                ))
+            prompt.append({"role": "system", "content": "\n\n".join(parts)})
+
+        for message in recent:
+            if message.get("role") == "action" and self.latest_results.get(message.get("name")) != message.get("content"):
+                message = dict(message, content=json.dumps("(superseded by a later result)"))
+            prompt.append(message)
+
+        self.token_history.append(estimate_tokens(prompt))
+        return prompt
+
+    def stats(self) -> dict:
+        return {
+            "last_prompt_tokens": self.token_history[-1] if self.token_history else 0,
+            "max_prompt_tokens": max(self.token_history, default=0),
+            "messages_folded": self.folded_upto - 1,
+            "summary_lines": len(self.summary_lines),
+        }
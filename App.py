@@ -1,17 +1,9 @@
 import streamlit as st
-import streamlit as st
-from Mcp_Action import *
-import streamlit as st
 import time
 import json
-from Actions import *
-from huggingface_hub import InferenceClient
-from dotenv import load_dotenv
-import os
 from collections import Counter
-from streamlit_ace import st_ace
-from streamlit_autorefresh import st_autorefresh
-import streamlit.components.v1 as components
+# Page modules are imported inside their role branch, so the role selection page renders
+# without the LLM, sandbox, embedding or scraping stacks (see Bench_Startup.py).
 # Initialize session state
 if "role" not in st.session_state:
     st.session_state.role = None
@@ -33,42 +25,41 @@ if st.session_state.role is None:
             st.rerun()
 
 if st.session_state.role == "student":
+    from Actions import *
+    from Llm_Gateway import chat_completion
+    from Question_Prefetch import QuestionPrefetcher
+    from Question_Bank import get_question_bank
+    import Scheduler
+    from Evaluator_Core import EvaluationSession
+    from streamlit_ace import st_ace
     #--------------------------------------------------------------------------------------------------------
-    # === LLM Client Setup ===
-    load_dotenv()
-    hf_token = os.getenv("hf_token")
-    client = InferenceClient(provider="fireworks-ai", api_key=hf_token)
-
     # === UI Setup ===
     st.set_page_config(page_title="Intelligent Evaluator", layout="centered")
     st.title("Intelligent Evaluator (LLM-assisted Flow)")
 
     # === Session Initialization ===
-    if "topic" not in st.session_state:
-        st.session_state.topic = ""
-    if "tags" not in st.session_state:
-        st.session_state.tags = []
-    if "beliefs" not in st.session_state:
-        st.session_state.beliefs = {}
+    # All evaluation state lives on one EvaluationSession; this page only adds UI state
+    if "evaluation" not in st.session_state:
+        st.session_state.evaluation = EvaluationSession()
     if "question" not in st.session_state:
         st.session_state.question = {}
-    if "question_count" not in st.session_state:
-        st.session_state.question_count = 0
-    if "max_questions" not in st.session_state:
-        st.session_state.max_questions = 10
     if "step" not in st.session_state:
         st.session_state.step = "start"
-    if "question_counts" not in st.session_state:
-        st.session_state.question_counts = {}
+
+    evaluation = st.session_state.evaluation
+    question_bank = get_question_bank(generate_question)
+    if "prefetcher" not in st.session_state:
+        st.session_state.prefetcher = QuestionPrefetcher(generate_question, bank=question_bank)
 
     def end_test():
+        st.session_state.prefetcher.discard()
         st.session_state.step = "summarize"
 
     # === LLM Helper ===
     def call_llm_for_next_question(tags, beliefs, asked_types):
         type_counts = Counter(asked_types)
         total_asked = len(asked_types)
-        max_questions = st.session_state.max_questions
+        max_questions = evaluation.max_questions
         mcq_count = type_counts.get("MCQ", 0)
         short_answer_count = type_counts.get("ShortAnswer", 0)
         coding_count = type_counts.get("Coding", 0)
@@ -111,75 +102,120 @@ if st.session_state.role == "student":
         ]
         
         try:
-            response = client.chat.completions.create(
-            model="meta-llama/Llama-3.1-8B-Instruct",
-            messages=messages
-            )
-            return json.loads(response.choices[0].message.content)
+            # extract_json as the parser: a malformed decision is never cached
+            return chat_completion(messages=messages, parse=extract_json)
         except Exception as e:
             print(f"Failed to parse LLM response: {e}")
             st.error(f"Error in generating the question please restart the test.")
             return {}
 
+    def decide_next_question():
+        # The local scheduler is the default; the LLM decision is opt-in via SCHEDULER_MODE=llm
+        if Scheduler.SCHEDULER_MODE == "llm":
+            decision = call_llm_for_next_question(evaluation.tags, evaluation.beliefs, evaluation.asked_types)
+            if decision:
+                return decision
+        return evaluation.next_decision()
+
     # === Step 1: Enter Topic ===
     if st.session_state.step == "start":
         topic = st.text_input("Enter topic to evaluate:", value="Python")
+        # Kept in the URL so Restart (which clears session state) remembers who is testing
+        student_id = st.text_input("Your name or student ID (optional):", value=st.query_params.get("student", ""))
         if st.button("Start Test"):
             try:
-                result = generate_tags(topic)
-                st.session_state.topic = topic
-                st.session_state.tags = result.get("tags", [])
-                st.session_state.beliefs = result.get("beliefs", {})
-                st.session_state.asked_types = []
+                evaluation.student_id = normalize_text(student_id)
+                if evaluation.student_id:
+                    st.query_params["student"] = student_id.strip()
+                result = generate_tags(topic, session=evaluation)
+                if "error" in result:
+                    raise ValueError(result["message"])
                 st.session_state.step = "next_question"
                 st.rerun()
             except Exception as e:
                 print(f"Error generating tags: {e}")
                 st.error(f"Error in generating the question please restart the test.")
 
-    # === Step 2: LLM picks tag/type → generate question ===
+    # === Step 2: Scheduler picks tag/type → generate question ===
     elif st.session_state.step == "next_question":
-        if st.session_state.question_count >= st.session_state.max_questions:
+        # Stop at the question limit, or earlier once every tag's belief is certain enough
+        if evaluation.finished():
+            st.session_state.prefetcher.discard()
             st.session_state.step = "summarize"
             st.rerun()
         else:
-            decision = call_llm_for_next_question(
-                tags=st.session_state.tags,
-                beliefs=st.session_state.beliefs,
-                asked_types=st.session_state.get("asked_types", [])
-            )
+            decision = decide_next_question()
             if decision:
                 try:
-                    q = generate_question(
-                        tag=decision["tags"],
-                        type=decision["type"],
-                        difficulty=decision["difficulty"]
+                    # Bank first (no LLM call), then the prefetched candidate, then live generation
+                    drawn = question_bank.draw(
+                        evaluation.topic, decision["tags"], decision["type"],
+                        decision["difficulty"], evaluation.learner_id
                     )
+                    if drawn is not None:
+                        q, question_tags = drawn
+                        st.session_state.prefetcher.discard()
+                    else:
+                        prefetched = st.session_state.prefetcher.take(
+                            decision["type"], decision["tags"], decision["difficulty"]
+                        )
+                        # A prefetched question was generated for exactly this decision's tags
+                        question_tags = decision["tags"]
+                        if prefetched is not None:
+                            q = prefetched
+                        else:
+                            # Show the question text as soon as it has streamed in
+                            preview = st.empty()
+                            q = generate_question(
+                                tag=decision["tags"],
+                                type=decision["type"],
+                                difficulty=decision["difficulty"],
+                                on_question=lambda text: preview.markdown(f"**{text}**\n\n_Preparing the rest of the question..._")
+                            )
+                        # Live questions stock the bank for later sessions
+                        question_id, _ = question_bank.add(
+                            evaluation.topic, question_tags, decision["type"], decision["difficulty"], q
+                        )
+                        question_bank.mark_served(evaluation.learner_id, question_id)
                     print(q)
                     st.session_state.question = q
-                    st.session_state.current_tag = decision["tags"]
-                    st.session_state.asked_types.append(decision["type"])
+                    st.session_state.current_tag = question_tags
+                    st.session_state.current_difficulty = decision["difficulty"]
+                    st.session_state.current_type = decision["type"]
+                    evaluation.asked_types.append(decision["type"])
                     st.session_state.step = "show_question"
                     st.rerun()
                 except Exception as e:
                     print(f"Error generating question: {e}")
                     st.error(f"Error in generating the question please restart the test.")
             else:
-                print("LLM failed to suggest a next question.")
+                print("Scheduler failed to suggest a next question.")
                 st.error(f"Error in generating the question please restart the test.")
 
 # === Step 3: Show Question and Capture Answer ===
     # === Step 3: Show Question and Capture Answer ===
     elif st.session_state.step == "show_question":
         q = st.session_state.question
-        st.subheader(f"Question {st.session_state.question_count + 1}")
-        st.markdown(f"**{q['question']}**")
+        st.subheader(f"Question {evaluation.question_count + 1}")
+        st.markdown(f"**{q.question}**")
+
+        # Start generating the likely next question while the student works on this one.
+        # Only the local scheduler is predictable; guessing the LLM's pick wastes generations.
+        if evaluation.question_count + 1 < evaluation.max_questions and Scheduler.SCHEDULER_MODE == "local":
+            # Its pick after this answer is recorded, for a right and a wrong answer (the two usually differ)
+            predicted = evaluation.predict_decisions(
+                st.session_state.current_tag, st.session_state.get("current_difficulty"),
+                st.session_state.get("current_type")
+            )
+            st.session_state.prefetcher.start(
+                evaluation.question_count, predicted, topic=evaluation.topic, student_id=evaluation.learner_id
+            )
 
         # === Timer Setup ===
         if "question_start_time" not in st.session_state:
             st.session_state.question_start_time = time.time()
 
-        question_duration = q["time_limit"]
+        question_duration = q.time_limit
         elapsed = int(time.time() - st.session_state.question_start_time)
         remaining = max(question_duration - elapsed, 0)
 
@@ -216,23 +252,23 @@ if st.session_state.role == "student":
 
         # Check if the flag is set to clear the input fields
         if st.session_state.get("flag", True):
-            # if q["type"] == "MCQ":
+            # if q.type == "MCQ":
             #     st.session_state["mcq_answer"] = ""
-            if q["type"] == "ShortAnswer":
+            if q.type == "ShortAnswer":
                 st.session_state["short_answer"] = ""
-            elif q["type"] == "Coding":
+            elif q.type == "Coding":
                 st.session_state["coding_answer"] = ""
             st.session_state.flag = False  # Reset the flag
 
             # Clear stale answer if it's incompatible
         user_answer = None
-        if q["type"] == "MCQ":
-            user_answer = st.selectbox("Choose your answer:", q["options"], key="mcq_answer")
+        if q.type == "MCQ":
+            user_answer = st.selectbox("Choose your answer:", q.options, key="mcq_answer")
 
-        elif q["type"] == "ShortAnswer":
+        elif q.type == "ShortAnswer":
             user_answer = st.text_input("Enter your answer:", key="short_answer")
 
-        elif q["type"] == "Coding":
+        elif q.type == "Coding":
             st.markdown("**Please write your code inside a function named `solution` and return the expected result.**")
             st.markdown("Example:")
             st.code("def solution(...):\n    # your logic here\n    return result", language="python")
@@ -262,9 +298,11 @@ if st.session_state.role == "student":
             st.warning("Time is up! You can only skip this question.")
 
         if skipped:
-            st.session_state.beliefs = update_beliefs(tags=st.session_state.current_tag, score=0.0)
+            evaluation.record(
+                st.session_state.current_tag, 0.0,
+                st.session_state.get("current_difficulty"), st.session_state.get("current_type")
+            )
             st.success("Question skipped. Moving to the next one.")
-            st.session_state.question_count += 1
             st.session_state.flag = True
             st.session_state.step = "next_question"
             st.session_state.pop("question_start_time", None)
@@ -272,28 +310,24 @@ if st.session_state.role == "student":
 
         if submitted and not time_up:
             try:
-                score = 0
-                if q["type"] == "MCQ":
-                    score = evaluate_mcq([user_answer], q["correct_answer"])
-                elif q["type"] == "ShortAnswer":
-                    score = float(evaluate_short_answer(user_answer, q["correct_answer"]))
-                elif q["type"] == "Coding":
-                    result = run_code_in_sandbox(user_answer, q["test_cases"])
-                    passed = result.get("passed", 0)
-                    total = result.get("total", 1)
-                    score = passed / total
-                    st.write("Code Result:", result)
-
-                for tag in st.session_state.current_tag:
-                    st.session_state.question_counts[tag] += 1
-                st.session_state.question_count += 1
+                score, details = grade_answer(q, user_answer)
+                if details is not None:
+                    st.write("Code Result:", details)
+
+                # record() bumps question_count and question_counts itself
+                evaluation.record(
+                    st.session_state.current_tag, score,
+                    st.session_state.get("current_difficulty"), q.type
+                )
                 st.session_state.step = "next_question"
-                updated = update_beliefs(tags=st.session_state.current_tag, score=score)
-                st.session_state.beliefs = updated
                 st.success("Submitted successfully")
                 st.session_state.flag = True
                 st.session_state.pop("question_start_time", None)
                 st.rerun()
+            except SandboxUnavailable as e:
+                # Not the student's fault: nothing is recorded, the same question stays up
+                print(f"Sandbox unavailable: {e}")
+                st.error("Your code could not be run right now (the grading sandbox is busy). It was not graded; please submit again.")
             except Exception as e:
                 print(f"Error during evaluation: {e}")
                 st.error(f"Error in generating the question please restart the test.")
@@ -302,11 +336,20 @@ if st.session_state.role == "student":
 
     # === Step 4: Summary ===
     elif st.session_state.step == "summarize":
+        from Cohort_Store import get_cohort_store
         try:
-            summary = summarize_results(st.session_state.beliefs)
+            # Fold this session into the process-wide cohort arrays (idempotent across reruns)
+            get_cohort_store().sync_session(
+                evaluation.session_id, evaluation.engine.to_dict(), group=evaluation.topic
+            )
+            summary = summarize_results(evaluation.beliefs)
             st.subheader("Final Evaluation Summary")
             st.markdown(summary)
-            st.write("Beliefs:", st.session_state.beliefs)
+            st.write("Beliefs:", evaluation.beliefs)
+            st.write("Uncertainty (posterior std):", {
+                tag: round(evaluation.engine.std(tag), 3) for tag in evaluation.engine.posteriors
+            })
+            st.caption(f"Prefetch hit rate: {st.session_state.prefetcher.stats()['hit_rate']:.0%}")
 
             if st.button("Restart"):
                 for key in st.session_state.keys():
@@ -316,6 +359,7 @@ if st.session_state.role == "student":
             print(f"Failed to summarize results: {e}")
             st.error(f"Error in generating the question please restart the test.")
 if st.session_state.role == "sme":
+    from Mcp_Action import *
     st.set_page_config(page_title="Firecrawl Quiz Generator", layout="centered")
     st.title("Web-Based Intelligent Quiz Generator")
 
@@ -330,6 +374,16 @@ if st.session_state.role == "sme":
         st.session_state.step = "input"
 
     if st.session_state.step == "input":
+        with st.expander("Cohort analytics"):
+            from Cohort_Store import get_cohort_store
+            report = get_cohort_store().cohort_report()
+            if report["sessions"]:
+                st.write("Sessions:", report["sessions"], "· mean score:", round(report["mean_score"], 3))
+                st.write("Weakest tags per topic:", get_cohort_store().weakest_tags_by_group())
+                st.bar_chart(report["score_distribution"]["counts"])
+            else:
+                st.write("No completed student sessions yet.")
+
         # Multi-select for topics
         selected_topics = st.multiselect("Select one or more topics (optional):", list(topic_urls.keys()))
 
@@ -366,7 +420,10 @@ if st.session_state.role == "sme":
                     content = scrape_multiple(urls)
                 try:
                     with st.spinner("Generating quiz using LLM..."):
-                        quiz = call_llm_generate(content, num_questions=num_q,question_types=selected_qtypes)
+                        quiz = call_llm_generate(
+                            content, num_questions=num_q, question_types=selected_qtypes,
+                            topic=", ".join(selected_topics) or None
+                        )
                         st.session_state.quiz = quiz
                         st.session_state.step = "quiz"
                         st.rerun()
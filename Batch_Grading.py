@@ -0,0 +1,85 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from Actions import SandboxUnavailable, grade_answer, score_short_answers
+from Questions import parse_question
+from Sandbox_Runner import MAX_CONCURRENCY
+
+EMBED_BATCH_SIZE = int(os.getenv("GRADING_EMBED_BATCH_SIZE", 128))
+
+
+class BatchGrader:
+    """Grades many (question, answer) pairs at once, for a class or an SME quiz offline.
+
+    MCQs are scored against each record's precomputed answer set. Short answers first go
+    through the lexical tiers; every distinct remaining answer and reference is embedded
+    once, in batches, and those pairs are compared in one matrix operation. Coding answers go through grade_answer on a thread pool
+    (the sandbox result cache still applies). Scores equal grade_answer's item by item.
+    """
+
+    def __init__(self, embed_batch_size: int = EMBED_BATCH_SIZE, coding_workers: int = MAX_CONCURRENCY):
+        self.embed_batch_size = embed_batch_size
+        self.coding_workers = coding_workers
+        self.last_stats = {}
+
+    def grade(self, pairs: list) -> list:
+        """[(question, answer), ...] -> [score, ...] in input order; questions may be records or dicts.
+        A coding answer no sandbox could run scores None (ungraded), never 0."""
+        start = time.perf_counter()
+        parsed = {}
+        scores = [0.0] * len(pairs)
+        short, coding = [], []
+        tiers = []
+        for i, (question, answer) in enumerate(pairs):
+            # The same question object usually recurs across a class; parse it once
+            record = parsed.get(id(question))
+            if record is None:
+                record = parsed[id(question)] = parse_question(question)
+            if record.type == "MCQ":
+                scores[i] = record.score([answer])
+            elif record.type == "ShortAnswer":
+                short.append((i, answer, record.correct_answer))
+            else:
+                coding.append((i, record, answer))
+
+        if short:
+            short_scores, tiers = score_short_answers(
+                [answer for _, answer, _ in short], [reference for _, _, reference in short],
+                batch_size=self.embed_batch_size,
+            )
+            for (i, _, _), score in zip(short, short_scores):
+                scores[i] = float(score)
+
+        ungraded = 0
+        if coding:
+            with ThreadPoolExecutor(max_workers=max(self.coding_workers, 1)) as pool:
+                results = pool.map(lambda item: _grade_coding(item[1], item[2]), coding)
+                for (i, _, _), score in zip(coding, results):
+                    scores[i] = score
+                    ungraded += score is None
+
+        self.last_stats = {
+            "pairs": len(pairs),
+            "questions": len(parsed),
+            "mcq": len(pairs) - len(short) - len(coding),
+            "short_answer": len(short),
+            "short_answer_tiers": dict(Counter(tiers)),
+            "coding": len(coding),
+            "ungraded": ungraded,
+            "seconds": time.perf_counter() - start,
+        }
+        return scores
+
+
+def _grade_coding(question, answer):
+    try:
+        return grade_answer(question, answer)[0]
+    except SandboxUnavailable as e:
+        print(f"Sandbox unavailable, answer left ungraded: {e}")
+        return None
+
+
+def grade_batch(pairs: list, **options) -> list:
+    return BatchGrader(**options).grade(pairs)
@@ -0,0 +1,70 @@
+import math
+
+# Beta(0.5, 0.5) has mean 0.5 and one pseudo-observation, so its posterior mean after each
+# score is exactly the old running mean that started every tag at 0.5 with a count of 1.
+PRIOR_ALPHA = 0.5
+PRIOR_BETA = 0.5
+# Stop once every tag's posterior SD is below this. With 5-10 tags and two tags per question,
+# a 10-question test gives each tag only 2-4 observations, and a 50%-accuracy tag needs
+# about 11 to reach SD 0.14 (variance 0.02), so that threshold almost never fired.
+STOP_STD = 0.2
+STOP_VARIANCE = STOP_STD ** 2
+DIFFICULTY_WEIGHT = {"easy": 0.75, "medium": 1.0, "hard": 1.25}
+
+
+class BeliefEngine:
+    """Per-tag Beta posteriors over the probability the student answers a tag correctly.
+
+    A score in [0, 1] adds `score * weight` to alpha and `(1 - score) * weight` to beta. The
+    weight defaults to 1; pass a difficulty to let hard questions count a little more. State
+    is a plain dict of [alpha, beta] pairs, so it pickles and JSON-serializes.
+    """
+
+    def __init__(self, posteriors: dict = None, prior_alpha: float = PRIOR_ALPHA, prior_beta: float = PRIOR_BETA):
+        self.prior_alpha = prior_alpha
+        self.prior_beta = prior_beta
+        self.posteriors = {tag: list(ab) for tag, ab in (posteriors or {}).items()}
+
+    def add_tags(self, tags: list):
+        for tag in tags:
+            self.posteriors.setdefault(tag, [self.prior_alpha, self.prior_beta])
+
+    def update(self, tags: list, score: float, difficulty: str = None):
+        weight = DIFFICULTY_WEIGHT.get(difficulty, 1.0)
+        score = min(max(float(score), 0.0), 1.0)
+        self.add_tags(tags)
+        for tag in tags:
+            posterior = self.posteriors[tag]
+            posterior[0] += score * weight
+            posterior[1] += (1.0 - score) * weight
+
+    # === Posterior summaries ===
+    def mean(self, tag: str) -> float:
+        alpha, beta = self.posteriors[tag]
+        return alpha / (alpha + beta)
+
+    def variance(self, tag: str) -> float:
+        alpha, beta = self.posteriors[tag]
+        total = alpha + beta
+        return alpha * beta / (total * total * (total + 1))
+
+    def observations(self, tag: str) -> float:
+        alpha, beta = self.posteriors[tag]
+        return alpha + beta - self.prior_alpha - self.prior_beta
+
+    def means(self) -> dict:
+        return {tag: self.mean(tag) for tag in self.posteriors}
+
+    def variances(self) -> dict:
+        return {tag: self.variance(tag) for tag in self.posteriors}
+
+    def std(self, tag: str) -> float:
+        return math.sqrt(self.variance(tag))
+
+    # === Stopping rule ===
+    def confident(self, threshold: float = STOP_VARIANCE) -> bool:
+        """True once every tag's posterior variance is below `threshold`."""
+        return bool(self.posteriors) and all(self.variance(tag) < threshold for tag in self.posteriors)
+
+    def to_dict(self) -> dict:
+        return {tag: list(ab) for tag, ab in self.posteriors.items()}
@@ -0,0 +1,97 @@
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+
+# === Short-answer consistency benchmark ===
+# Scores a corpus of (answer, reference) pairs with the embedding model alone and with the
+# lexical tiers in front of it, and fails when a lexically settled answer disagrees with the
+# model at the 0.5 threshold.
+
+SAMPLE_REFERENCES = [
+    "Binary search halves the search interval on every comparison, so it runs in O(log n) time.",
+    "A hash table maps keys to buckets with a hash function for average O(1) lookups.",
+    "A process has its own address space while threads share the memory of their process.",
+    "TCP guarantees ordered, reliable delivery; UDP sends datagrams without those guarantees.",
+    "Normalization removes redundancy from relational tables to avoid update anomalies.",
+    "A closure is a function that captures variables from the scope where it was defined.",
+    "Gradient descent updates parameters in the direction of the negative gradient of the loss.",
+    "An index speeds up lookups at the cost of extra storage and slower writes.",
+]
+
+
+def synthetic_corpus(references: list) -> list:
+    """Typical answer shapes for each reference: copies, light edits, partial and unrelated
+    answers, empties and non-answers."""
+    pairs = []
+    for n, reference in enumerate(references):
+        words = reference.rstrip(".").split()
+        other = references[(n + 1) % len(references)]
+        for answer in (
+            reference, reference.upper(), f"  {reference}  ", reference.rstrip("."), " ".join(reversed(words)),
+            " ".join(words[: len(words) // 2]), " ".join(words[len(words) // 2:]), " ".join(words[:3]),
+            other, "", "   ", "idk", "I don't know", "no idea", "?", "yes", "it is", "pass",
+        ):
+            pairs.append({"answer": answer, "reference": reference})
+    return pairs
+
+
+def load_corpus(path: str) -> list:
+    """JSONL with one {"answer": ..., "reference": ...} object per line."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Lexical pre-filter vs. embedding-only short-answer grading.")
+    parser.add_argument("--corpus", help="JSONL of answer/reference pairs (default: a synthetic corpus)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    from Actions import SHORT_ANSWER_THRESHOLD, score_short_answers, short_answer_similarities
+
+    pairs = load_corpus(args.corpus) if args.corpus else synthetic_corpus(SAMPLE_REFERENCES)
+    answers = [pair["answer"] for pair in pairs]
+    references = [pair["reference"] for pair in pairs]
+
+    start = time.perf_counter()
+    similarities = short_answer_similarities(answers, references, batch_size=args.batch_size)
+    baseline = [1 if float(s) >= SHORT_ANSWER_THRESHOLD else 0 for s in similarities]
+    baseline_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tiered, tiers = score_short_answers(answers, references, batch_size=args.batch_size)
+    tiered_s = time.perf_counter() - start
+
+    counts = Counter(tiers)
+    mismatches = [
+        {"tier": tier, "answer": answer, "reference": reference, "similarity": round(float(similarity), 3)}
+        for answer, reference, similarity, base, score, tier in zip(answers, references, similarities, baseline, tiered, tiers)
+        if base != score
+    ]
+    report = {
+        "pairs": len(pairs),
+        "agreement": 1 - len(mismatches) / len(pairs) if pairs else 1.0,
+        "tier_shares": {tier: count / len(pairs) for tier, count in counts.most_common()},
+        "embedding_only_s": baseline_s,
+        "tiered_s": tiered_s,
+        "mismatches": mismatches,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['pairs']} pairs, agreement {report['agreement']:.2%} at threshold {SHORT_ANSWER_THRESHOLD}")
+        for tier, share in report["tier_shares"].items():
+            print(f"    {tier:<12} {share:6.1%}")
+        # The embedding cache is warm for the second run, so compare these with that in mind
+        print(f"    embedding only {baseline_s * 1000:8.1f} ms, tiered {tiered_s * 1000:8.1f} ms")
+        for mismatch in mismatches:
+            print(f"    MISMATCH [{mismatch['tier']}] sim={mismatch['similarity']} {mismatch['answer']!r} vs {mismatch['reference']!r}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
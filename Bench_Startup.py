@@ -0,0 +1,116 @@
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+# === Startup benchmark ===
+# Imports each entry module in a fresh interpreter under `-X importtime`, reports where the
+# time goes and fails when a module blows its budget or drags in a dependency it shouldn't.
+DEFAULT_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", 300))
+
+# Dependencies that must only load on first use, never at import
+HEAVY_MODULES = ["torch", "sentence_transformers", "transformers", "docker", "requests", "huggingface_hub", "httpx"]
+
+TARGETS = {
+    # Only what App.py imports at module level, i.e. what the role selection page pays for
+    "role_page": {"app": "App.py", "forbid": HEAVY_MODULES + ["numpy"]},
+    "Actions": {"forbid": HEAVY_MODULES},
+    "Mcp_Action": {"forbid": HEAVY_MODULES},
+    "Evaluator_Core": {"forbid": HEAVY_MODULES},
+    "Llm_Gateway": {"forbid": HEAVY_MODULES},
+}
+
+
+def top_level_imports(path: str) -> list:
+    """Import statements at module level (not inside if/def blocks) of a script, as source lines."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def parse_importtime(stderr: str) -> list:
+    """-X importtime lines -> [(module, depth, self_us, cumulative_us)] for the imports made
+    after interpreter startup (everything up to and including `site` is skipped)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+        if depth == 0 and name.strip() == "site":
+            rows = []
+    return rows
+
+
+def measure(name: str, target: dict) -> dict:
+    if "app" in target:
+        imports = top_level_imports(target["app"])
+    else:
+        imports = [f"import {name}"]
+    script = "\n".join(imports + ["import sys", "print(sorted(sys.modules))"])
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    rows = parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+        return {"target": name, "error": error}
+    loaded = set(ast.literal_eval(proc.stdout.strip().splitlines()[-1]))
+    return {
+        "target": name,
+        # Depth-0 cumulative times add up to the wall time of the target's own imports
+        "total_ms": sum(cum for _, depth, _, cum in rows if depth == 0) / 1000,
+        "slowest": sorted(((mod, self_us / 1000) for mod, _, self_us, _ in rows), key=lambda r: -r[1])[:10],
+        "forbidden_loaded": sorted(m for m in target.get("forbid", []) if m in loaded),
+    }
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark with per-module budgets.")
+    parser.add_argument("targets", nargs="*", default=list(TARGETS), help="targets to measure (default: all)")
+    parser.add_argument("--budget", action="append", default=[], metavar="TARGET=MS",
+                        help=f"per-target budget in ms (default {DEFAULT_BUDGET_MS:g})")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per target; the fastest counts")
+    parser.add_argument("--allow-skip", action="store_true",
+                        help="report targets that fail to import as skipped instead of failing")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    budgets = {k: float(v) for k, v in (b.split("=", 1) for b in args.budget)}
+
+    reports, failed = [], False
+    for name in args.targets:
+        runs = [measure(name, TARGETS.get(name, {"forbid": HEAVY_MODULES})) for _ in range(max(args.repeat, 1))]
+        report = min(runs, key=lambda r: r.get("total_ms", float("inf")))
+        report["budget_ms"] = budgets.get(name, DEFAULT_BUDGET_MS)
+        if "error" in report:
+            # An import that breaks is a startup regression too, unless missing deps are expected here
+            report["status"] = "skipped" if args.allow_skip else "fail"
+            failed = failed or not args.allow_skip
+        elif report["forbidden_loaded"] or report["total_ms"] > report["budget_ms"]:
+            report["status"] = "fail"
+            failed = True
+        else:
+            report["status"] = "ok"
+        reports.append(report)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            if "error" in report:
+                print(f"{report['target']:<16} {report['status']:<9} ({report['error']})")
+                continue
+            print(f"{report['target']:<16} {report['status']:<9} {report['total_ms']:8.1f} ms / {report['budget_ms']:g} ms budget")
+            if report["forbidden_loaded"]:
+                print(f"    loaded at import: {', '.join(report['forbidden_loaded'])}")
+            for module, ms in report["slowest"][:5]:
+                print(f"    {ms:8.1f} ms  {module} (self)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def stable_hash(*parts) -> str:
+    """sha256 over a JSON encoding of the parts, stable across processes and runs."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU with hit/miss counters."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class DiskCache:
+    """JSON values stored one file per key, evicting least recently used files past max_bytes."""
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 ** 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path in self._files())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _files(self):
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+
+    def get(self, key: str, default=None):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+            os.utime(path)  # mtime doubles as last-access time for eviction
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return default
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value):
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(value, f)
+        with self._lock:
+            old = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp, path)
+            self._size += os.path.getsize(path) - old
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop oldest-accessed files until we're back under 90% of the budget
+        target = self.max_bytes * 0.9
+        entries = []
+        for path in self._files():
+            try:
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:
+                continue
+        for _, size, path in sorted(entries):
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class TieredCache:
+    """In-memory LRU in front of an optional DiskCache; disk hits are promoted to memory."""
+
+    def __init__(self, max_entries: int = 1024, directory: str = None, max_bytes: int = 256 * 1024 ** 2):
+        self.memory = LRUCache(max_entries)
+        self.disk = DiskCache(directory, max_bytes) if directory else None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is _MISSING and self.disk is not None:
+            value = self.disk.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.set(key, value)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory": self.memory.stats(),
+        }
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+class SqliteCache:
+    """Persistent key/value store with per-entry TTL and LRU eviction past max_entries.
+    Values are JSON; survives restarts and can be shared by processes on one host."""
+
+    def __init__(self, path: str, ttl: float = None, max_entries: int = 10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                if row is not None:
+                    with self._conn:
+                        self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.misses += 1
+                return default
+            with self._conn:
+                self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value, ttl: float = None):
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires = now + ttl if ttl else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,228 @@
+import threading
+
+import numpy as np
+
+from Beliefs import PRIOR_ALPHA, PRIOR_BETA
+
+# Bucket edges shared with summarize_results: weak <= 0.3 < moderate <= 0.7 < strong
+BUCKET_EDGES = np.array([0.3, 0.7])
+BUCKETS = ["weak", "moderate", "strong"]
+
+
+def bucket_index(beliefs):
+    """0 = weak, 1 = moderate, 2 = strong, for a scalar or an array of beliefs."""
+    return np.searchsorted(BUCKET_EDGES, beliefs, side="left")
+
+
+class CohortBeliefStore:
+    """Beta posteriors for every session in the process as dense students x tags arrays.
+
+    Tags share one vocabulary across sessions; a session only "has" the tags it registered,
+    tracked by a boolean mask, so cohort statistics ignore tags a student was never tested on.
+    """
+
+    def __init__(self, capacity: int = 1024, tag_capacity: int = 64):
+        self.tags = []
+        self.tag_index = {}
+        self.session_ids = []
+        self.session_index = {}
+        self.groups = []
+        self.alpha = np.full((capacity, tag_capacity), PRIOR_ALPHA)
+        self.beta = np.full((capacity, tag_capacity), PRIOR_BETA)
+        self.present = np.zeros((capacity, tag_capacity), dtype=bool)
+        self._lock = threading.Lock()
+
+    # === Shape management ===
+    def _grow(self, rows: int, cols: int):
+        old_rows, old_cols = self.alpha.shape
+        if rows <= old_rows and cols <= old_cols:
+            return
+        new_rows = max(old_rows, 1)
+        while new_rows < rows:
+            new_rows *= 2
+        new_cols = max(old_cols, 1)
+        while new_cols < cols:
+            new_cols *= 2
+        for name, fill in (("alpha", PRIOR_ALPHA), ("beta", PRIOR_BETA), ("present", False)):
+            old = getattr(self, name)
+            grown = np.full((new_rows, new_cols), fill, dtype=old.dtype)
+            grown[:old_rows, :old_cols] = old
+            setattr(self, name, grown)
+
+    def _tag_ids(self, tags: list) -> list:
+        ids = []
+        for tag in tags:
+            index = self.tag_index.get(tag)
+            if index is None:
+                index = self.tag_index[tag] = len(self.tags)
+                self.tags.append(tag)
+            ids.append(index)
+        return ids
+
+    def _row(self, session_id: str, group: str = None) -> int:
+        row = self.session_index.get(session_id)
+        if row is None:
+            row = self.session_index[session_id] = len(self.session_ids)
+            self.session_ids.append(session_id)
+            self.groups.append(group)
+        elif group is not None:
+            self.groups[row] = group
+        return row
+
+    @property
+    def n_sessions(self) -> int:
+        return len(self.session_ids)
+
+    @property
+    def n_tags(self) -> int:
+        return len(self.tags)
+
+    # === Writes ===
+    def register(self, session_id: str, tags: list, group: str = None) -> int:
+        with self._lock:
+            row = self._row(session_id, group)
+            ids = self._tag_ids(tags)
+            self._grow(self.n_sessions, self.n_tags)
+            self.present[row, ids] = True
+            return row
+
+    def update_batch(self, session_ids: list, tag_lists: list, scores, weights=None):
+        """Apply many graded answers at once; answer i adds to every tag in tag_lists[i]."""
+        scores = np.clip(np.asarray(scores, dtype=float), 0.0, 1.0)
+        weights = np.ones_like(scores) if weights is None else np.asarray(weights, dtype=float)
+        with self._lock:
+            rows, cols, owners = [], [], []
+            for i, (session_id, tags) in enumerate(zip(session_ids, tag_lists)):
+                row = self._row(session_id)
+                ids = self._tag_ids(tags)
+                rows.extend([row] * len(ids))
+                cols.extend(ids)
+                owners.extend([i] * len(ids))
+            self._grow(self.n_sessions, self.n_tags)
+            rows, cols, owners = np.array(rows, dtype=int), np.array(cols, dtype=int), np.array(owners, dtype=int)
+            # np.add.at accumulates repeated (row, col) pairs instead of keeping only the last
+            np.add.at(self.alpha, (rows, cols), scores[owners] * weights[owners])
+            np.add.at(self.beta, (rows, cols), (1.0 - scores[owners]) * weights[owners])
+            self.present[rows, cols] = True
+
+    def sync_session(self, session_id: str, posteriors: dict, group: str = None):
+        """Copy one session's BeliefEngine posteriors ({tag: [alpha, beta]}) into the store."""
+        with self._lock:
+            row = self._row(session_id, group)
+            ids = self._tag_ids(list(posteriors))
+            self._grow(self.n_sessions, self.n_tags)
+            if ids:
+                ab = np.array(list(posteriors.values()), dtype=float)
+                self.alpha[row, ids] = ab[:, 0]
+                self.beta[row, ids] = ab[:, 1]
+                self.present[row, ids] = True
+
+    # === Reads ===
+    def means(self) -> np.ndarray:
+        """students x tags posterior means, NaN where a session never saw the tag."""
+        n, t = self.n_sessions, self.n_tags
+        alpha, beta = self.alpha[:n, :t], self.beta[:n, :t]
+        return np.where(self.present[:n, :t], alpha / (alpha + beta), np.nan)
+
+    def session_buckets(self, session_id: str) -> dict:
+        row = self.session_index[session_id]
+        means = self.means()[row]
+        mask = ~np.isnan(means)
+        buckets = bucket_index(means[mask])
+        names = np.array(self.tags)[mask]
+        return {name: names[buckets == i].tolist() for i, name in enumerate(BUCKETS)}
+
+    def cohort_report(self, k: int = 3, bins: int = 10, group: str = None) -> dict:
+        """Weakest tags, per-tag mean belief, bucket counts and the distribution of per-student scores."""
+        means = self.means()
+        if group is not None:
+            means = means[np.array([g == group for g in self.groups], dtype=bool)]
+        if means.size == 0:
+            return {"sessions": 0}
+        seen = ~np.isnan(means)
+        seen_counts = seen.sum(axis=0)
+        tag_means = np.where(seen_counts > 0, np.nansum(means, axis=0) / np.maximum(seen_counts, 1), np.nan)
+        order = [i for i in np.argsort(tag_means) if not np.isnan(tag_means[i])]
+
+        # All (bucket, tag) counts from a single bincount over the seen cells
+        n_tags = means.shape[1]
+        buckets = bucket_index(means[seen])
+        cols = np.nonzero(seen)[1]
+        bucket_counts = np.bincount(buckets * n_tags + cols, minlength=len(BUCKETS) * n_tags)
+        bucket_counts = bucket_counts.reshape(len(BUCKETS), n_tags)
+
+        tested = seen.any(axis=1)
+        student_scores = (np.nansum(means, axis=1) / np.maximum(seen.sum(axis=1), 1))[tested]
+        histogram, edges = np.histogram(student_scores, bins=bins, range=(0.0, 1.0))
+        return {
+            "sessions": int(means.shape[0]),
+            "weakest_tags": [(self.tags[i], float(tag_means[i])) for i in order[:k]],
+            "tag_means": {self.tags[i]: float(tag_means[i]) for i in order},
+            "tag_buckets": {
+                self.tags[i]: dict(zip(BUCKETS, bucket_counts[:, i].tolist())) for i in order
+            },
+            "score_distribution": {"counts": histogram.tolist(), "edges": edges.tolist()},
+            "mean_score": float(student_scores.mean()) if student_scores.size else float("nan"),
+        }
+
+    def weakest_tags_by_group(self, k: int = 3) -> dict:
+        """cohort_report(group=g)["weakest_tags"] for every group, in one pass over the means."""
+        names = sorted({g for g in self.groups if g is not None})
+        if not names:
+            return {}
+        code_of = {name: i for i, name in enumerate(names)}
+        codes = np.array([code_of.get(g, -1) for g in self.groups], dtype=int)
+        grouped = codes >= 0
+        means = self.means()[grouped]
+        seen = ~np.isnan(means)
+        # groups x sessions membership matrix: one matmul sums every tag column per group
+        membership = np.zeros((len(names), means.shape[0]))
+        membership[codes[grouped], np.arange(means.shape[0])] = 1.0
+        sums = membership @ np.where(seen, means, 0.0)
+        counts = membership @ seen
+        tag_means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        # argsort puts NaN (never tested in that group) last
+        order = np.argsort(tag_means, axis=1, kind="stable")[:, :k]
+        return {
+            name: [(self.tags[i], float(tag_means[g, i])) for i in order[g] if not np.isnan(tag_means[g, i])]
+            for g, name in enumerate(names)
+        }
+
+    # === Persistence ===
+    def save(self, path: str):
+        with self._lock:
+            n, t = self.n_sessions, self.n_tags
+            np.savez_compressed(
+                path,
+                alpha=self.alpha[:n, :t], beta=self.beta[:n, :t], present=self.present[:n, :t],
+                tags=np.array(self.tags, dtype=object), session_ids=np.array(self.session_ids, dtype=object),
+                groups=np.array(self.groups, dtype=object),
+            )
+
+    @classmethod
+    def load(cls, path: str):
+        data = np.load(path, allow_pickle=True)
+        store = cls(capacity=max(len(data["session_ids"]), 1), tag_capacity=max(len(data["tags"]), 1))
+        store.tags = data["tags"].tolist()
+        store.tag_index = {tag: i for i, tag in enumerate(store.tags)}
+        store.session_ids = data["session_ids"].tolist()
+        store.session_index = {sid: i for i, sid in enumerate(store.session_ids)}
+        store.groups = data["groups"].tolist()
+        n, t = data["alpha"].shape
+        store.alpha[:n, :t] = data["alpha"]
+        store.beta[:n, :t] = data["beta"]
+        store.present[:n, :t] = data["present"]
+        return store
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cohort_store() -> CohortBeliefStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CohortBeliefStore()
+    return _store
@@ -0,0 +1,181 @@
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+from Cache import LRUCache, stable_hash
+from Embedding_Service import get_embedding_service
+
+CHUNK_TOKENS = int(os.getenv("CONTENT_CHUNK_TOKENS", 200))
+CONTEXT_TOP_K = int(os.getenv("CONTENT_TOP_K", 6))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTENT_TOKEN_BUDGET", 1200))
+DEFAULT_QUERY = "key concepts, definitions, rules and code examples"
+
+SOURCE_HEADER = re.compile(r"^Content from (\S+):$", re.MULTILINE)
+BOILERPLATE = re.compile(
+    r"cookie|privacy policy|terms of (use|service)|all rights reserved|©|subscribe|newsletter|"
+    r"sign (in|up)|log ?in|skip to (main )?content|table of contents|share on|follow us",
+    re.IGNORECASE,
+)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text: str) -> int:
+    # Same ~4 characters per token rule as Agent_Context.estimate_tokens
+    return len(text) // 4 + 1
+
+
+def split_sources(content: str) -> dict:
+    """scrape_multiple output -> {url: text}; error placeholders are dropped."""
+    parts = SOURCE_HEADER.split(content)
+    sources = {}
+    for url, text in zip(parts[1::2], parts[2::2]):
+        text = re.sub(r"^\[ERROR scraping .*$", "", text, flags=re.MULTILINE).strip()
+        if text:
+            sources[url] = text
+    if not sources and content.strip():
+        sources["content"] = content.strip()
+    return sources
+
+
+# === Cleaning and chunking ===
+def strip_boilerplate(sources: dict) -> dict:
+    """Drop navigation/legal lines: short lines matching common boilerplate, and short
+    lines that repeat (menus and footers show up on every page of a site)."""
+    line_counts = Counter(
+        line.strip() for text in sources.values() for line in text.splitlines() if line.strip()
+    )
+    cleaned = {}
+    for url, text in sources.items():
+        kept = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                kept.append("")
+                continue
+            short = len(line.split()) < 12
+            if short and (BOILERPLATE.search(line) or line_counts[line] > 1):
+                continue
+            kept.append(line)
+        cleaned[url] = "\n".join(kept)
+    return cleaned
+
+
+def chunk_text(text: str, max_tokens: int = CHUNK_TOKENS) -> list:
+    """Pack paragraphs into chunks of at most ~max_tokens; oversized paragraphs split on sentences."""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(SENTENCE_END.split(paragraph))
+
+    chunks, current = [], ""
+    for piece in pieces:
+        candidate = f"{current}\n{piece}" if current else piece
+        if current and count_tokens(candidate) > max_tokens:
+            chunks.append(current)
+            candidate = piece
+        # A single sentence longer than the limit is hard-split by characters
+        while count_tokens(candidate) > max_tokens:
+            chunks.append(candidate[:max_tokens * 4])
+            candidate = candidate[max_tokens * 4:]
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _fingerprint(chunk: str) -> str:
+    return stable_hash(" ".join(re.sub(r"[^\w\s]", "", chunk.lower()).split()))
+
+
+# === Index ===
+class ContentIndex:
+    """Deduplicated chunks of scraped pages plus a normalized embedding matrix over them."""
+
+    def __init__(self, sources: dict, chunk_tokens: int = CHUNK_TOKENS):
+        self.chunks = []
+        self.chunk_sources = []
+        self.duplicates = 0
+        seen = set()
+        for url, text in strip_boilerplate(sources).items():
+            # Paragraphs are deduplicated before packing so a repeated block can't hide inside
+            # chunks that otherwise differ; whole chunks are checked again after packing.
+            paragraphs = []
+            for paragraph in re.split(r"\n\s*\n", text):
+                fingerprint = _fingerprint(paragraph)
+                if not paragraph.strip() or fingerprint in seen:
+                    self.duplicates += bool(paragraph.strip())
+                    continue
+                seen.add(fingerprint)
+                paragraphs.append(paragraph)
+            for chunk in chunk_text("\n\n".join(paragraphs), chunk_tokens):
+                fingerprint = _fingerprint(chunk)
+                if fingerprint in seen:
+                    self.duplicates += 1
+                    continue
+                seen.add(fingerprint)
+                self.chunks.append(chunk)
+                self.chunk_sources.append(url)
+        self.embeddings = None
+        if self.chunks:
+            vectors = get_embedding_service().encode_cached(self.chunks)
+            self.embeddings = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def scores(self, query: str) -> np.ndarray:
+        vector = np.asarray(get_embedding_service().encode(query, convert_to_tensor=False), dtype=np.float32)
+        return self.embeddings @ (vector / max(np.linalg.norm(vector), 1e-12))
+
+    def contexts(self, query: str, n: int, k: int = CONTEXT_TOP_K, token_budget: int = CONTEXT_TOKEN_BUDGET) -> list:
+        """n context strings, each the best still-unused chunks for `query` (at most k, within
+        token_budget). Chunks are handed out greedily so different questions see different
+        material; once every chunk has been used the ranking starts over."""
+        if not self.chunks:
+            return [""] * n
+        ranked = [int(i) for i in np.argsort(-self.scores(query))]
+        contexts, cursor = [], 0
+        for _ in range(n):
+            picked, used = [], 0
+            for _ in range(len(ranked)):
+                if len(picked) >= k:
+                    break
+                chunk = self.chunks[ranked[cursor % len(ranked)]]
+                cost = count_tokens(chunk)
+                if used + cost > token_budget and picked:
+                    break
+                picked.append(chunk)
+                used += cost
+                cursor += 1
+            contexts.append("\n\n".join(picked))
+        return contexts
+
+    def stats(self) -> dict:
+        return {
+            "chunks": len(self.chunks),
+            "duplicates": self.duplicates,
+            "sources": len(set(self.chunk_sources)),
+            "tokens": sum(count_tokens(chunk) for chunk in self.chunks),
+        }
+
+
+# Quizzes regenerated from the same scrape reuse the index instead of re-embedding
+_indexes = LRUCache(max_entries=8)
+_indexes_lock = threading.Lock()
+
+
+def get_content_index(content: str) -> ContentIndex:
+    key = stable_hash(content, CHUNK_TOKENS)
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = ContentIndex(split_sources(content))
+                _indexes.set(key, index)
+    return index
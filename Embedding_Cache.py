@@ -0,0 +1,160 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from Cache import LRUCache, stable_hash
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(".cache", "embeddings"))
+EMBEDDING_CACHE_ENTRIES = int(os.getenv("EMBEDDING_CACHE_ENTRIES", 4096))
+
+
+def normalize_for_embedding(text: str) -> str:
+    # Whitespace runs and edges never reach the tokenizer, so collapsing them can't change
+    # the embedding; case and punctuation can, so they're kept.
+    return " ".join(str(text).split())
+
+
+class EmbeddingMatrixStore:
+    """float32 embedding rows appended to one flat file, read back through a memmap.
+
+    A SQLite table maps each key to its row, so a new process starts warm without loading
+    the matrix; only the pages of rows actually read are paged in. Appends take SQLite's
+    write lock, which also keeps several grading processes from interleaving rows.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.matrix_path = os.path.join(directory, "embeddings.f32")
+        self.dim = None
+        self._map = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL) WITHOUT ROWID;
+        """)
+        self._load_dim()
+        open(self.matrix_path, "ab").close()
+
+    def _load_dim(self):
+        # Another process may have written the first rows since this one opened the store
+        if self.dim is None:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+            self.dim = row[0] if row else None
+        return self.dim
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def _rows(self, needed: int):
+        # Remap only when a row past the current mapping is requested (another writer grew the file)
+        if self._map is None or needed >= self._map.shape[0]:
+            count = os.path.getsize(self.matrix_path) // (self.dim * 4)
+            self._map = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(count, self.dim)) if count else None
+        return self._map
+
+    def _lookup(self, keys: list) -> dict:
+        found = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            query = f"SELECT key, row FROM rows WHERE key IN ({','.join('?' * len(batch))})"
+            found.update(self._conn.execute(query, batch).fetchall())
+        return found
+
+    def get_many(self, keys: list) -> dict:
+        if not keys or self._load_dim() is None:
+            return {}
+        with self._lock:
+            found = self._lookup(keys)
+            if not found:
+                return {}
+            matrix = self._rows(max(found.values()))
+            return {key: np.array(matrix[row]) for key, row in found.items()}
+
+    def put_many(self, keys: list, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._load_dim() is None:
+                    self.dim = int(vectors.shape[1])
+                    self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?)", (self.dim,))
+                existing = self._lookup(keys)
+                fresh = [i for i, key in enumerate(keys) if key not in existing]
+                if fresh:
+                    first_row = os.path.getsize(self.matrix_path) // (self.dim * 4)
+                    with open(self.matrix_path, "ab") as f:
+                        f.write(vectors[fresh].tobytes())
+                    self._conn.executemany(
+                        "INSERT INTO rows VALUES (?, ?)",
+                        [(keys[i], first_row + n) for n, i in enumerate(fresh)],
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class EmbeddingCache:
+    """Embeddings keyed by (model, normalized text hash): an in-memory LRU in front of an
+    optional memory-mapped matrix on disk. encode() returns exactly what the model
+    produced for each text the first time it was seen."""
+
+    def __init__(self, model_name: str, directory: str = EMBEDDING_CACHE_DIR, max_entries: int = EMBEDDING_CACHE_ENTRIES):
+        self.model_name = model_name
+        self.memory = LRUCache(max_entries)
+        self.store = EmbeddingMatrixStore(os.path.join(directory, stable_hash(model_name)[:16])) if directory else None
+        self._stats_lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        return stable_hash(self.model_name, normalize_for_embedding(text))
+
+    def encode(self, texts: list, encode_fn) -> np.ndarray:
+        """Rows for `texts` as a float32 matrix; encode_fn(list_of_texts) embeds the misses."""
+        keys = [self.key(text) for text in texts]
+        vectors = {}
+        for key in dict.fromkeys(keys):
+            vector = self.memory.get(key)
+            if vector is not None:
+                vectors[key] = vector
+        memory_hits = len(vectors)
+
+        pending = [key for key in dict.fromkeys(keys) if key not in vectors]
+        disk = self.store.get_many(pending) if self.store is not None and pending else {}
+        for key, vector in disk.items():
+            vectors[key] = vector
+            self.memory.set(key, vector)
+
+        missing = [key for key in pending if key not in disk]
+        if missing:
+            text_for = dict(zip(keys, texts))
+            encoded = np.asarray(encode_fn([normalize_for_embedding(text_for[key]) for key in missing]), dtype=np.float32)
+            for key, vector in zip(missing, encoded):
+                vectors[key] = vector
+                self.memory.set(key, vector)
+            if self.store is not None:
+                self.store.put_many(missing, encoded)
+
+        with self._stats_lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += len(disk)
+            self.misses += len(missing)
+        return np.stack([vectors[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "disk_rows": len(self.store) if self.store is not None else 0,
+            }
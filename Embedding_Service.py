@@ -0,0 +1,112 @@
+import threading
+import time
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+class EmbeddingService:
+    """Loads a SentenceTransformer once and serves encode calls from any thread/session."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu"):
+        self.model_name = model_name
+        self.device = device
+        self._model = None
+        self._cache = None
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.load_time = None
+        self.calls = 0
+        self.texts_encoded = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def _get_model(self):
+        # Double-checked so concurrent first calls only load the weights once
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    start = time.perf_counter()
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+                    self.load_time = time.perf_counter() - start
+        return self._model
+
+    def encode(self, text: str, convert_to_tensor: bool = True):
+        """Embed a single text."""
+        return self.encode_batch([text], convert_to_tensor=convert_to_tensor)[0]
+
+    def encode_batch(self, texts: list, convert_to_tensor: bool = True, batch_size: int = 32):
+        """Embed a list of texts in one forward pass per batch."""
+        model = self._get_model()
+        start = time.perf_counter()
+        embeddings = model.encode(
+            list(texts),
+            convert_to_tensor=convert_to_tensor,
+            device=self.device,
+            batch_size=batch_size,
+        )
+        latency = time.perf_counter() - start
+        with self._stats_lock:
+            self.calls += 1
+            self.texts_encoded += len(texts)
+            self.total_latency += latency
+            self.last_latency = latency
+        return embeddings
+
+    def encode_cached(self, texts: list, batch_size: int = 32):
+        """encode_batch(..., convert_to_tensor=False) through the embedding cache, as a float32
+        matrix. Only texts never seen under this model reach the model."""
+        if self._cache is None:
+            with self._load_lock:
+                if self._cache is None:
+                    from Embedding_Cache import EmbeddingCache
+                    self._cache = EmbeddingCache(self.model_name)
+        return self._cache.encode(
+            list(texts), lambda misses: self.encode_batch(misses, convert_to_tensor=False, batch_size=batch_size)
+        )
+
+    def stats(self) -> dict:
+        cache = self._cache.stats() if self._cache is not None else None
+        with self._stats_lock:
+            return {
+                "model": self.model_name,
+                "loaded": self.loaded,
+                "load_time": self.load_time,
+                "calls": self.calls,
+                "texts_encoded": self.texts_encoded,
+                "last_latency": self.last_latency,
+                "avg_latency": self.total_latency / self.calls if self.calls else 0.0,
+                "cache": cache,
+            }
+
+
+def cosine_rows(a, b):
+    """Row-wise cosine similarity of two equally shaped embedding matrices, as float32."""
+    import numpy as np
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    dots = np.einsum("ij,ij->i", a, b)
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return dots / np.maximum(norms, 1e-8)
+
+
+# === Process-wide singleton ===
+# Streamlit re-executes scripts per session but imports modules once per process,
+# so every session shares the service registered here.
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(model_name: str = DEFAULT_MODEL_NAME) -> EmbeddingService:
+    service = _services.get(model_name)
+    if service is None:
+        with _services_lock:
+            service = _services.get(model_name)
+            if service is None:
+                service = EmbeddingService(model_name)
+                _services[model_name] = service
+    return service
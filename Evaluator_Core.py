@@ -0,0 +1,119 @@
+import copy
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import Scheduler
+from Beliefs import BeliefEngine
+
+
+@dataclass
+class EvaluationSession:
+    """Everything one adaptive evaluation needs, with no UI attached.
+
+    Plain data plus a BeliefEngine, so it pickles into worker processes and back. The
+    Streamlit apps keep one of these in st.session_state; batch jobs create their own.
+    """
+
+    session_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    student_id: str = ""     # stable across restarts when the student gives one
+    topic: str = ""
+    tags: list = field(default_factory=list)
+    beliefs: dict = field(default_factory=dict)
+    question_counts: dict = field(default_factory=dict)
+    asked_types: list = field(default_factory=list)
+    question_count: int = 0
+    max_questions: int = 10
+    engine: BeliefEngine = field(default_factory=BeliefEngine)
+    history: list = field(default_factory=list)
+
+    @property
+    def learner_id(self) -> str:
+        """Who "already seen" questions are tracked for: the student, else this one session."""
+        return self.student_id or self.session_id
+
+    def start(self, topic: str, tags: list):
+        self.topic = topic
+        self.tags = list(tags)
+        self.engine.add_tags(self.tags)
+        for tag in self.tags:
+            self.beliefs[tag] = self.engine.mean(tag)
+            self.question_counts[tag] = 1
+
+    def record(self, tags: list, score: float, difficulty: str = None, qtype: str = None):
+        """Fold one graded (or skipped, score 0) question into the beliefs."""
+        self.engine.update(tags, score, difficulty)
+        for tag in tags:
+            self.beliefs[tag] = self.engine.mean(tag)
+            self.question_counts[tag] = self.question_counts.get(tag, 1) + 1
+        self.question_count += 1
+        self.history.append({"tags": list(tags), "type": qtype, "difficulty": difficulty, "score": score})
+        return self.beliefs
+
+    def next_decision(self) -> dict:
+        return Scheduler.next_question(
+            self.tags, self.beliefs, self.asked_types, self.question_counts,
+            variances=self.engine.variances()
+        )
+
+    def predict_decisions(self, tags: list, difficulty: str = None, qtype: str = None, scores=(0.0, 1.0)) -> list:
+        """The distinct next decisions after the current question is answered with each of `scores`.
+
+        The local scheduler is deterministic, so these are what next_decision() will return
+        once record() has run; outcomes that end the test are left out.
+        """
+        decisions = []
+        for score in scores:
+            after = copy.deepcopy(self)
+            after.record(tags, score, difficulty, qtype)
+            if not after.finished():
+                decision = after.next_decision()
+                if decision not in decisions:
+                    decisions.append(decision)
+        return decisions
+
+    def finished(self) -> bool:
+        # Question limit, or early stop once every tag's posterior is tight enough
+        return self.question_count >= self.max_questions or self.engine.confident()
+
+
+# === Headless flows ===
+def run_headless(topic: str, answer_fn, tags: list = None, max_questions: int = 10,
+                 session: EvaluationSession = None) -> EvaluationSession:
+    """Run the student flow end to end without a UI.
+
+    answer_fn(question: Question) -> answer is called with each question record (see
+    Questions.py; `.to_dict()` gives the JSON shape) and returns a chosen option, free text
+    or code. Pass `tags` to skip tag generation.
+    """
+    from Actions import generate_question, generate_tags, grade_answer
+
+    session = session or EvaluationSession(max_questions=max_questions)
+    if tags:
+        session.start(topic, tags)
+    else:
+        result = generate_tags(topic, session=session)
+        if "error" in result:
+            raise ValueError(result["message"])
+
+    while not session.finished():
+        decision = session.next_decision()
+        question = generate_question(tag=decision["tags"], type=decision["type"], difficulty=decision["difficulty"])
+        session.asked_types.append(decision["type"])
+        score, _ = grade_answer(question, answer_fn(question))
+        session.record(decision["tags"], score, decision["difficulty"], decision["type"])
+    return session
+
+
+def _run_job(job: dict) -> EvaluationSession:
+    return run_headless(**job)
+
+
+def run_many(jobs: list, processes: int = None) -> list:
+    """Run independent headless evaluations across processes; results keep input order.
+
+    Each job is a dict of run_headless keyword arguments. answer_fn must be picklable
+    (a module-level function).
+    """
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_run_job, jobs))
@@ -1,27 +1,14 @@
 import streamlit as st
 import json
 import time
-from huggingface_hub import InferenceClient
-from streamlit_autorefresh import st_autorefresh
+from functools import partial
+import streamlit.components.v1 as components
 from Actions import *
-from dotenv import load_dotenv
-import os
+from Llm_Gateway import chat_completion
+from Cache import stable_hash
+from Agent_Context import AgentContext
+from Evaluator_Core import EvaluationSession
 
-# === Fireworks.ai client setup ===
-load_dotenv()
-hf_token = os.getenv("hf_token")
-client = InferenceClient(provider="fireworks-ai", api_key=hf_token)
-
-# === Action Map ===
-action_map = {
-    "generate_tags": generate_tags,
-    "generate_question": generate_question,
-    "evaluate_mcq": evaluate_mcq,
-    "evaluate_short_answer": evaluate_short_answer,
-    "run_code_in_sandbox": run_code_in_sandbox,
-    "update_beliefs": update_beliefs,
-    "summarize_results": summarize_results
-}
 
 # # === LLM Response Stub ===
 # class FakeLLMResponse:
@@ -40,11 +27,7 @@ action_map = {
 
 def call_llm_agent(messages, actions=None):
     # prompt = json.dumps({"messages": messages, "actions": actions or []})
-    completion = client.chat.completions.create(
-        model="meta-llama/Llama-3.1-8B-Instruct",
-        messages=messages
-    )
-    return completion.choices[0].message
+    return chat_completion(messages=messages)
 
 # === Utility ===
 def clear_user_input():
@@ -100,6 +83,25 @@ if "messages" not in st.session_state:
 if "action_results" not in st.session_state:
     st.session_state.action_results = []
 
+if "agent_context" not in st.session_state:
+    st.session_state.agent_context = AgentContext()
+
+if "evaluation" not in st.session_state:
+    st.session_state.evaluation = EvaluationSession()
+
+# === Action Map ===
+# Belief-touching actions are bound to this browser session's EvaluationSession
+action_map = {
+    "generate_tags": partial(generate_tags, session=st.session_state.evaluation),
+    # Records go back to the model as JSON
+    "generate_question": lambda **kwargs: generate_question(**kwargs).to_dict(),
+    "evaluate_mcq": evaluate_mcq,
+    "evaluate_short_answer": evaluate_short_answer,
+    "run_code_in_sandbox": run_code_in_sandbox,
+    "update_beliefs": partial(update_beliefs, session=st.session_state.evaluation),
+    "summarize_results": summarize_results
+}
+
 # === Start Assessment ===
 if "started" not in st.session_state:
     topic = st.text_input("Enter the topic to evaluate:", "Python")
@@ -108,85 +110,138 @@ if "started" not in st.session_state:
         st.session_state.messages.append({"role": "user", "content": f"Start evaluating the topic: {topic}"})
         st.rerun()
 
+# === Agent State Machine ===
+# "thinking"        → history changed since the last model call; ask the model (once per history)
+# "awaiting_answer" → a question is on screen; nothing is sent until the student acts
+# "paused"          → too many automatic steps in a row; wait for the student to continue
+MAX_AUTO_STEPS = 8
+ANSWER_TIME_LIMIT = 60
+
+def history_hash(messages):
+    return stable_hash(messages)
+
+def agent_response(messages):
+    """Model reply for this exact history, memoized so reruns never repeat a call."""
+    key = history_hash(messages)
+    memo = st.session_state.get("agent_memo")
+    if memo and memo["hash"] == key:
+        return memo["content"]
+    # Send a bounded window (system prompt + summary + recent turns), not the whole history
+    prompt = st.session_state.agent_context.build(messages)
+    content = call_llm_agent(prompt) or ""
+    st.session_state.agent_memo = {"hash": key, "content": content}
+    st.session_state.llm_calls = st.session_state.get("llm_calls", 0) + 1
+    return content
+
+def run_action(content):
+    """Execute a CALL: line and append the call plus its result (or error) to the history."""
+    st.session_state.messages.append({"role": "assistant", "content": content})
+    try:
+        _, rest = content.split("CALL:", 1)
+        action_name, args_json = rest.strip().split(" ", 1)
+        action_name = action_name.strip()
+        args = json.loads(args_json)
+    except Exception as e:
+        st.session_state.messages.append({"role": "user", "content": f"Failed to parse action call: {e}. Use the exact CALL format."})
+        return
+    if action_name not in action_map:
+        st.session_state.messages.append({"role": "user", "content": f"Action '{action_name}' not recognized."})
+        return
+    try:
+        # Call the action function with the parsed args
+        result = action_map[action_name](**args) if isinstance(args, dict) else action_map[action_name]()
+        st.session_state.action_results.append({action_name: result})
+    except Exception as e:
+        result = {"error": f"Error executing action '{action_name}': {e}"}
+    st.session_state.messages.append({
+        "role": "action",
+        "name": action_name,
+        "content": json.dumps(result)
+    })
+
+def show_countdown(remaining):
+    # Ticks in the browser, so the server isn't rerun every second
+    components.html(f"""
+        <div id="timer" style="font-size:18px; color:#336699;"></div>
+        <script>
+        let countdown = {remaining};
+        let timerElement = document.getElementById("timer");
+        function updateTimer() {{
+            timerElement.innerHTML = countdown > 0
+                ? "⏳ Time remaining: " + countdown + " seconds"
+                : "⏰ Time's up! This answer will not be evaluated.";
+            countdown--;
+            if (countdown < 0) clearInterval(timer);
+        }}
+        updateTimer();
+        let timer = setInterval(updateTimer, 1000);
+        </script>
+    """, height=40)
+
 # === Assessment Flow ===
 if st.session_state.get("started", False):
-    # Refresh every second to update countdown
-    st_autorefresh(interval=1000, limit=None, key="timer_refresh")
+    if "agent_state" not in st.session_state:
+        st.session_state.agent_state = "thinking"
+        st.session_state.auto_steps = 0
+
+    if st.session_state.agent_state == "thinking":
+        try:
+            content = agent_response(st.session_state.messages)
+        except Exception as e:
+            st.error(f"Error contacting the evaluator: {e}")
+            if st.button("Retry"):
+                st.rerun()
+            st.stop()
 
-    llm_response = call_llm_agent(st.session_state.messages)
-    content = llm_response.content or ""
-    st.chat_message("ai").write(content)
-
-    try:
-        # Check for action call
         if "CALL:" in content:
-            print("here")
-            try:
-                _, rest = content.split("CALL:")
-                action_name, args_json = rest.strip().split(" ", 1)
-                action_name = action_name.strip()
-                args = json.loads(args_json)
-                if action_name in action_map:
-                    try:
-                        # Call the action function with the parsed args
-                        result = action_map[action_name](**args) if isinstance(args, dict) else action_map[action_name]()
-
-                        # Store the result
-                        st.session_state.action_results.append({action_name: result})
-
-                        # Add the assistant message and action response message
-                        st.session_state.messages.append({"role": "assistant", "content": content})
-                        st.session_state.messages.append({
-                            "role": "action",
-                            "name": action_name,
-                            "content": json.dumps(result)
-                        })
-
-                    except Exception as e:
-                        st.error(f"Error executing action '{action_name}': {e}")
-                else:
-                    st.error(f"Action '{action_name}' not recognized.")
-            except Exception as e:
-                st.error(f"Failed to parse action call: {e}")
+            st.chat_message("ai").write(content)
+            run_action(content)
+            st.session_state.auto_steps += 1
+            if st.session_state.auto_steps >= MAX_AUTO_STEPS:
+                st.session_state.agent_state = "paused"
         else:
-            # Display question and handle answer
             st.session_state.messages.append({"role": "assistant", "content": content})
+            st.session_state.agent_state = "awaiting_answer"
+            st.session_state.question_start_time = time.time()
+        st.rerun()
 
-            if "user_answer" not in st.session_state:
-                st.session_state.user_answer = ""
-
-            if st.session_state.get("clear_input_next", False):
-                clear_user_input()
-                st.session_state.clear_input_next = False
-
-            # Start timer for question
-            if "question_start_time" not in st.session_state:
-                st.session_state.question_start_time = time.time()
-
-            # Show countdown
-            time_limit = 60
-            elapsed = time.time() - st.session_state.question_start_time
-            remaining_time = max(0, int(time_limit - elapsed))
-            st.info(f"⏳ Time remaining: {remaining_time} seconds")
-
-            if remaining_time == 0:
-                st.error("⏰ Time's up! This answer will not be evaluated.")
-
-            # Input and submission
-            user_answer = st.text_input("Your Answer:", value="", key="user_answer_input")
-            if st.button("Submit Answer"):
-                if user_answer.strip():
-                    time_taken = time.time() - st.session_state.question_start_time
-                    if time_taken > time_limit:
-                        st.warning("⏰ Time limit exceeded! This answer will not be evaluated.")
-                    else:
-                        st.session_state.messages.append({"role": "user", "content": user_answer.strip()})
-                    st.session_state.clear_input_next = True
-                    st.session_state.pop("question_start_time", None)
-                    st.rerun()
-
-    except Exception as e:
-        st.error(f"Error parsing action call or response: {e}")
+    elif st.session_state.agent_state == "paused":
+        st.warning("The evaluator has taken several steps in a row.")
+        if st.button("Continue"):
+            st.session_state.auto_steps = 0
+            st.session_state.agent_state = "thinking"
+            st.rerun()
+
+    elif st.session_state.agent_state == "awaiting_answer":
+        st.chat_message("ai").write(st.session_state.messages[-1]["content"])
+
+        if st.session_state.get("clear_input_next", False):
+            clear_user_input()
+            st.session_state.clear_input_next = False
+
+        elapsed = time.time() - st.session_state.question_start_time
+        show_countdown(max(0, int(ANSWER_TIME_LIMIT - elapsed)))
+
+        # Input and submission
+        user_answer = st.text_input("Your Answer:", value="", key="user_answer_input")
+        if st.button("Submit Answer"):
+            if user_answer.strip():
+                time_taken = time.time() - st.session_state.question_start_time
+                if time_taken > ANSWER_TIME_LIMIT:
+                    st.session_state.messages.append({"role": "user", "content": "(No answer: time limit exceeded.)"})
+                else:
+                    st.session_state.messages.append({"role": "user", "content": user_answer.strip()})
+                st.session_state.clear_input_next = True
+                st.session_state.auto_steps = 0
+                st.session_state.agent_state = "thinking"
+                st.rerun()
+
+    context_stats = st.session_state.agent_context.stats()
+    st.caption(
+        f"LLM calls this session: {st.session_state.get('llm_calls', 0)} · "
+        f"last prompt ≈ {context_stats['last_prompt_tokens']} tokens "
+        f"(max {context_stats['max_prompt_tokens']})"
+    )
 
 
 
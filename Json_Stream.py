@@ -0,0 +1,215 @@
+import json
+import re
+
+QUESTION_TYPES = ("MCQ", "ShortAnswer", "Coding")
+
+# JSON types a field can never be parsed from; unknown keys are tolerated. Kept no stricter
+# than parse_question, which does the normalization (a null or "120" time_limit falls back
+# to the default, a non-string Coding answer is stringified), so the stream never rejects
+# a question the full parse would accept.
+QUESTION_SCHEMA = {
+    "question": str,
+    "type": str,
+    "options": (list, type(None)),
+    "correct_answer": (str, list, int, float, type(None)),
+    "time_limit": (int, float, str, type(None)),
+    "test_cases": (list, type(None)),
+}
+
+MAX_PREFIX_CHARS = 200   # prose allowed before the opening brace (e.g. a code fence)
+
+_PY_LITERALS = re.compile(r"\b(None|True|False)\b")
+_TRAILING_COMMA = re.compile(r",\s*([\]}])")
+
+
+def strip_comments(text: str) -> str:
+    """Remove // line comments (the prompt templates contain some) outside of strings."""
+    out, i, in_string = [], 0, False
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            in_string = ch != '"'
+        elif ch == '"':
+            in_string = True
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = len(text) if end == -1 else end
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def loads_tolerant(text: str):
+    """json.loads, retried with comments stripped and Python literals and trailing commas fixed up."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        fixed = _PY_LITERALS.sub(lambda m: {"None": "null", "True": "true", "False": "false"}[m.group(1)], strip_comments(text))
+        return json.loads(_TRAILING_COMMA.sub(r"\1", fixed))
+
+
+class StreamError(ValueError):
+    pass
+
+
+class QuestionStreamParser:
+    """Incremental parser for one question object arriving in chunks.
+
+    feed() scans only the new characters, tracking strings and nesting. Each top-level
+    field is decoded and checked against QUESTION_SCHEMA as soon as its value closes, so
+    a bad field or broken syntax is reported while the model is still writing, and
+    `done` flips as soon as the closing brace arrives.
+    """
+
+    def __init__(self, expected_type: str = None, schema: dict = QUESTION_SCHEMA):
+        self.expected_type = expected_type
+        self.schema = schema
+        self.buffer = ""
+        self.fields = {}
+        self.done = False
+        self.error = None
+        self._pos = 0
+        self._start = None       # index of the opening brace
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = "key"     # key | key_string | colon | value | in_value | after_value (depth 1)
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+        self._comment = False
+
+    @property
+    def result(self) -> dict:
+        return self.fields if self.done else None
+
+    def feed(self, text: str) -> list:
+        """Consume more output; returns the (key, value) fields completed by this chunk.
+        Raises StreamError on the first sign of malformed output."""
+        if self.done or self.error:
+            return []
+        self.buffer += text
+        completed = []
+        try:
+            self._scan(completed)
+        except StreamError as e:
+            self.error = str(e)
+            raise
+        return completed
+
+    def _fail(self, message: str):
+        raise StreamError(message)
+
+    def _scan(self, completed: list):
+        buffer = self.buffer
+        while self._pos < len(buffer) and not self.done:
+            i, ch = self._pos, buffer[self._pos]
+            self._pos += 1
+
+            if self._start is None:
+                if ch == "{":
+                    self._start, self._depth = i, 1
+                elif i >= MAX_PREFIX_CHARS:
+                    self._fail("No JSON object at the start of the response.")
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect == "key_string":
+                        self._key = json.loads(buffer[self._key_start:i + 1])
+                        self._expect = "colon"
+                    elif self._depth == 1 and self._expect == "in_value":
+                        self._close_value(buffer[self._value_start:i + 1], completed)
+                continue
+
+            if self._depth > 1:
+                if ch == '"':
+                    self._in_string = True
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch in "}]":
+                    self._depth -= 1
+                    if self._depth == 1:
+                        self._close_value(buffer[self._value_start:i + 1], completed)
+                continue
+
+            # === Top level of the object ===
+            if self._comment:
+                self._comment = ch != "\n"
+                continue
+            if ch.isspace():
+                continue
+            if ch == "/" and self._expect in ("key", "after_value", "value"):
+                self._comment = True
+                continue
+            if self._expect == "key" and ch == '"':
+                self._in_string, self._key_start, self._expect = True, i, "key_string"
+            elif self._expect == "colon":
+                if ch != ":":
+                    self._fail(f"Expected ':' after key {self._key!r}.")
+                self._expect, self._value_start = "value", None
+            elif self._expect in ("value", "in_value", "after_value"):
+                if ch in ",}":
+                    if self._value_start is None:
+                        self._fail(f"Missing value for {self._key!r}.")
+                    if self._expect == "in_value":
+                        # Bare literals (numbers, true/false/null) only end at the delimiter
+                        self._close_value(buffer[self._value_start:i], completed)
+                    if ch == "}":
+                        self._finish()
+                    else:
+                        self._expect = "key"
+                    continue
+                if self._expect == "after_value":
+                    self._fail(f"Expected ',' or '}}' after {self._key!r}.")
+                if self._value_start is None:
+                    self._value_start = i
+                    self._expect = "in_value"
+                if ch == '"':
+                    self._in_string = True
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch == "]":
+                    self._fail(f"Unbalanced ']' in {self._key!r}.")
+            elif ch == "}" and self._expect == "key":
+                self._finish()
+            else:
+                self._fail(f"Unexpected {ch!r} where a key was expected.")
+
+    def _close_value(self, raw: str, completed: list):
+        key = self._key
+        try:
+            value = loads_tolerant(raw.strip())
+        except json.JSONDecodeError as e:
+            self._fail(f"Invalid value for {key!r}: {e}")
+        expected = self.schema.get(key)
+        if expected is not None and not isinstance(value, expected):
+            self._fail(f"Field {key!r} has the wrong type ({type(value).__name__}).")
+        if key == "type":
+            if value not in QUESTION_TYPES:
+                self._fail(f"Unknown question type {value!r}.")
+            if self.expected_type and value != self.expected_type:
+                self._fail(f"Asked for a {self.expected_type} question, got {value}.")
+        self.fields[key] = value
+        completed.append((key, value))
+        self._expect = "after_value"
+
+    def _finish(self):
+        missing = [key for key in ("question", "type") if key not in self.fields]
+        if self.fields.get("type") == "Coding":
+            missing += [] if "test_cases" in self.fields else ["test_cases"]
+        elif "correct_answer" not in self.fields:
+            missing.append("correct_answer")
+        if missing:
+            self._fail(f"Question object is missing {', '.join(missing)}.")
+        self.done = True
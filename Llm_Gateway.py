@@ -0,0 +1,424 @@
+import asyncio
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from Cache import LRUCache, SqliteCache, stable_hash
+
+load_dotenv()
+
+DEFAULT_MODEL = "meta-llama/Llama-3.1-8B-Instruct"
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+
+# Hugging Face's OpenAI-compatible router; "<model>:<provider>" pins the provider
+API_URL = os.getenv("LLM_API_URL", "https://router.huggingface.co/v1/chat/completions")
+PROVIDER = os.getenv("LLM_PROVIDER", "fireworks-ai")
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LlmError(RuntimeError):
+    pass
+
+
+class ChatStream:
+    """Iterator over the text deltas of one streamed completion.
+
+    Iterate from any thread; close() cancels the request on the gateway loop, which
+    frees its concurrency slot and stops token generation on the server side.
+    """
+
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.text = ""
+        self.emitted = False     # set by the producer, so it's current even before deltas are read
+        self.cancelled = False
+        self._queue = queue.Queue()
+        self._future = None
+
+    def _emit(self, kind: str, value=None):
+        if kind == "delta":
+            self.emitted = True
+        self._queue.put((kind, value))
+
+    def __iter__(self):
+        while True:
+            try:
+                kind, value = self._queue.get(timeout=max(self.deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                self.close()
+                raise LlmError("LLM stream exceeded its deadline.")
+            if kind == "delta":
+                self.text += value
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+
+    def close(self):
+        if self._future is not None and not self._future.done():
+            self.cancelled = True
+            self._future.cancel()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LlmResponseCache:
+    """Memoizes completions by (model, messages, sampling params).
+    An in-memory LRU sits in front of a SQLite store that survives restarts."""
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL, max_entries: int = 512):
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries)
+        self.store = SqliteCache(path, ttl=ttl, max_entries=20000) if path else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_latency = 0.0
+        self.evicted_invalid = 0
+
+    @staticmethod
+    def key(model: str, messages: list, params: dict) -> str:
+        return stable_hash(model, messages, params)
+
+    def get(self, key: str):
+        entry = self.memory.get(key)
+        if entry is not None and entry["expires"] < time.time():
+            self.memory.pop(key)
+            entry = None
+        if entry is None and self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_latency += entry["latency"]
+        return entry["content"]
+
+    def set(self, key: str, content: str, latency: float):
+        entry = {"content": content, "latency": latency, "expires": time.time() + self.ttl}
+        self.memory.set(key, entry)
+        if self.store is not None:
+            self.store.set(key, entry)
+
+    def pop(self, key: str):
+        self.memory.pop(key)
+        if self.store is not None:
+            self.store.delete(key)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "saved_latency": self.saved_latency,
+            "evicted_invalid": self.evicted_invalid,
+        }
+
+
+class LlmGateway:
+    """One pooled async HTTP client for every LLM call in the process.
+
+    The client, its keep-alive connection pool and the concurrency semaphore all live on a
+    private event loop thread. Async callers on any loop can await achat(); Streamlit script
+    threads use chat() (blocking) or submit() (returns a concurrent Future).
+    """
+
+    def __init__(self, api_url: str = API_URL, api_key: str = None, max_concurrency: int = MAX_CONCURRENCY,
+                 timeout: float = DEFAULT_TIMEOUT, max_retries: int = MAX_RETRIES):
+        self.api_url = api_url
+        self.api_key = api_key or os.getenv("hf_token")
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.total_latency = 0.0
+        self.streams_cancelled = 0
+
+    # === Event loop thread ===
+    def _ensure_started(self):
+        if self._loop is not None:
+            return self._loop
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+                self._loop = loop
+        return self._loop
+
+    async def _setup(self):
+        import httpx   # deferred so importing the gateway stays cheap until the first call
+        self._client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            timeout=httpx.Timeout(self.timeout, connect=10.0),
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _record(self, latency: float = 0.0, retries: int = 0, failed: bool = False):
+        with self._stats_lock:
+            self.requests += 1
+            self.retries += retries
+            self.total_latency += latency
+            if failed:
+                self.failures += 1
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: str = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), 30.0)
+            except ValueError:
+                pass
+        # Full jitter keeps a burst of throttled students from retrying in lockstep
+        return random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+
+    # === Requests (run on the gateway loop) ===
+    async def _post(self, payload: dict, deadline: float) -> dict:
+        import httpx
+        attempt = 0
+        start = time.perf_counter()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._record(time.perf_counter() - start, attempt, failed=True)
+                raise LlmError("LLM call exceeded its deadline.")
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    response = await self._client.post(self.api_url, json=payload, timeout=remaining)
+                if response.status_code == 200:
+                    self._record(time.perf_counter() - start, attempt)
+                    return response.json()
+                if response.status_code not in RETRY_STATUSES:
+                    self._record(time.perf_counter() - start, attempt, failed=True)
+                    raise LlmError(f"LLM call failed with {response.status_code}: {response.text[:500]}")
+                retry_after = response.headers.get("retry-after")
+                error = LlmError(f"LLM call failed with {response.status_code}")
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                error = LlmError(f"LLM call failed: {e}")
+            if attempt >= self.max_retries:
+                self._record(time.perf_counter() - start, attempt, failed=True)
+                raise error
+            delay = min(self._backoff(attempt, retry_after), max(deadline - time.monotonic(), 0))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _stream_on_loop(self, payload: dict, stream: ChatStream):
+        import httpx
+        attempt = 0
+        start = time.perf_counter()
+        try:
+            while True:
+                remaining = stream.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LlmError("LLM call exceeded its deadline.")
+                retry_after = None
+                try:
+                    async with self._semaphore:
+                        async with self._client.stream("POST", self.api_url, json={**payload, "stream": True},
+                                                       timeout=remaining) as response:
+                            if response.status_code == 200:
+                                await self._relay_events(response, stream)
+                                self._record(time.perf_counter() - start, attempt)
+                                stream._emit("done")
+                                return
+                            body = (await response.aread()).decode(errors="replace")
+                    if response.status_code not in RETRY_STATUSES:
+                        raise LlmError(f"LLM call failed with {response.status_code}: {body[:500]}")
+                    retry_after = response.headers.get("retry-after")
+                    error = LlmError(f"LLM call failed with {response.status_code}")
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    error = LlmError(f"LLM call failed: {e}")
+                # Only a request that hasn't streamed anything yet can be retried transparently
+                if attempt >= self.max_retries or stream.emitted:
+                    raise error
+                delay = min(self._backoff(attempt, retry_after), max(stream.deadline - time.monotonic(), 0))
+                attempt += 1
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            with self._stats_lock:
+                self.streams_cancelled += 1
+            self._record(time.perf_counter() - start, attempt)
+            raise
+        except LlmError as e:
+            self._record(time.perf_counter() - start, attempt, failed=True)
+            stream._emit("error", e)
+
+    @staticmethod
+    async def _relay_events(response, stream: ChatStream):
+        # OpenAI-style server-sent events: "data: {chunk}" lines, ending with "data: [DONE]"
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            try:
+                choices = json.loads(data).get("choices") or [{}]
+            except ValueError:
+                raise LlmError(f"Unexpected LLM stream event: {data[:200]}")
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                stream._emit("delta", delta)
+
+    async def _chat_on_loop(self, payload: dict, timeout: float) -> str:
+        data = await self._post(payload, time.monotonic() + timeout)
+        try:
+            return data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LlmError(f"Unexpected LLM response: {str(data)[:500]}")
+
+    def _payload(self, messages: list, model: str, params: dict) -> dict:
+        return {"model": f"{model}:{PROVIDER}" if PROVIDER else model, "messages": messages, **params}
+
+    # === Public API ===
+    def submit(self, messages: list, model: str = DEFAULT_MODEL, timeout: float = None, **params):
+        """Schedule a completion and return a concurrent.futures.Future for its text."""
+        loop = self._ensure_started()
+        coro = self._chat_on_loop(self._payload(messages, model, params), timeout or self.timeout)
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def stream(self, messages: list, model: str = DEFAULT_MODEL, timeout: float = None, **params) -> ChatStream:
+        """Start a streamed completion; iterate the returned ChatStream for text deltas."""
+        loop = self._ensure_started()
+        stream = ChatStream(time.monotonic() + (timeout or self.timeout))
+        coro = self._stream_on_loop(self._payload(messages, model, params), stream)
+        stream._future = asyncio.run_coroutine_threadsafe(coro, loop)
+        return stream
+
+    async def achat(self, messages: list, model: str = DEFAULT_MODEL, timeout: float = None, **params) -> str:
+        return await asyncio.wrap_future(self.submit(messages, model, timeout, **params))
+
+    def chat(self, messages: list, model: str = DEFAULT_MODEL, timeout: float = None, **params) -> str:
+        return self.submit(messages, model, timeout, **params).result()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "streams_cancelled": self.streams_cancelled,
+                "avg_latency": self.total_latency / self.requests if self.requests else 0.0,
+            }
+
+
+# Built on first use: the response cache opens its SQLite file, which import shouldn't do
+_gateway = None
+_response_cache = None
+_singletons_lock = threading.Lock()
+
+
+def get_gateway() -> LlmGateway:
+    global _gateway
+    if _gateway is None:
+        with _singletons_lock:
+            if _gateway is None:
+                _gateway = LlmGateway()
+    return _gateway
+
+
+def get_response_cache() -> LlmResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        with _singletons_lock:
+            if _response_cache is None:
+                _response_cache = LlmResponseCache()
+    return _response_cache
+
+
+def _from_cache(response_cache: LlmResponseCache, key: str, parse):
+    """(True, value) for a cached reply that still parses; a cached reply that doesn't is evicted."""
+    content = response_cache.get(key) if key is not None else None
+    if content is None:
+        return False, None
+    if parse is None:
+        return True, content
+    try:
+        return True, parse(content)
+    except Exception:
+        response_cache.pop(key)
+        with response_cache._lock:
+            response_cache.evicted_invalid += 1
+        return False, None
+
+
+def _store(response_cache: LlmResponseCache, key: str, content: str, parse, start: float):
+    # parse runs before anything is cached: a reply the caller can't use must not stick for the TTL
+    value = parse(content) if parse is not None else content
+    if key is not None and content:
+        response_cache.set(key, content, time.perf_counter() - start)
+    return value
+
+
+def chat_completion(messages: list, model: str = DEFAULT_MODEL, cache: bool = True, timeout: float = None,
+                    parse=None, **params):
+    """Single entry point for every chat completion in the app (blocking).
+
+    Identical (model, messages, params) requests are answered from the cache. Pass
+    cache=False where a fresh sample is wanted, e.g. a new question for the same tags.
+    With `parse`, returns parse(reply), and a reply is only cached once parse accepted it
+    (its exceptions reach the caller). Raises LlmError once retries or the deadline are exhausted.
+    """
+    response_cache = get_response_cache()
+    key = response_cache.key(model, messages, params) if cache else None
+    hit, value = _from_cache(response_cache, key, parse)
+    if hit:
+        return value
+
+    start = time.perf_counter()
+    content = get_gateway().chat(messages, model=model, timeout=timeout, **params)
+    return _store(response_cache, key, content, parse, start)
+
+
+async def achat_completion(messages: list, model: str = DEFAULT_MODEL, cache: bool = True, timeout: float = None,
+                           parse=None, **params):
+    """Async twin of chat_completion, usable from any event loop."""
+    response_cache = get_response_cache()
+    key = response_cache.key(model, messages, params) if cache else None
+    hit, value = _from_cache(response_cache, key, parse)
+    if hit:
+        return value
+
+    start = time.perf_counter()
+    content = await get_gateway().achat(messages, model=model, timeout=timeout, **params)
+    return _store(response_cache, key, content, parse, start)
+
+
+def stream_completion(messages: list, model: str = DEFAULT_MODEL, timeout: float = None, **params) -> ChatStream:
+    """Streamed, uncached completion. Iterate for text deltas; close() cancels early."""
+    return get_gateway().stream(messages, model=model, timeout=timeout, **params)
+
+
+def cache_stats() -> dict:
+    return get_response_cache().stats()
+
+
+def gateway_stats() -> dict:
+    return get_gateway().stats()
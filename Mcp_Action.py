@@ -1,67 +1,48 @@
 import os
 import json
 import re
-import requests
+import time
+import asyncio
 from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
+from Llm_Gateway import LlmError, achat_completion
+from Questions import QuestionError, parse_question
+from Content_Index import DEFAULT_QUERY, get_content_index
+from Scraper import FirecrawlFetcher, SCRAPE_TIMEOUT, get_scraper
  
 load_dotenv()
  
-FIRECRAWL_API_KEY = os.getenv("firecrawl_api_key")
-HF_TOKEN = os.getenv("hf_token")
- 
-client = InferenceClient(provider="fireworks-ai", api_key=HF_TOKEN)
- 
 def scrape_with_firecrawl(url: str) -> str:
     """Scrape visible text content from a single webpage using Firecrawl."""
-    response = requests.post(
-        "https://api.firecrawl.dev/v1/scrape",
-        headers={
-            "Authorization": f"Bearer {FIRECRAWL_API_KEY}",
-            "Content-Type": "application/json"
-        },
-        json={"url": url}
-    )
-    if response.status_code != 200:
-        raise Exception(f"Failed to scrape {url}: {response.text}")
-   
-    data = response.json()
-    return data.get("content", {}).get("text", "")
+    return FirecrawlFetcher().fetch(url, SCRAPE_TIMEOUT)["text"]
  
 def scrape_multiple(urls: list) -> str:
+    # Concurrent, cached and revalidated; see Scraper.py for the fetcher and cache settings
     texts = []
-    for url in urls:
-        try:
-            content = scrape_with_firecrawl(url)
+    for url, content in get_scraper().scrape_many(urls):
+        if isinstance(content, Exception):
+            texts.append(f"[ERROR scraping {url}]: {content}")
+        else:
             texts.append(f"Content from {url}:\n{content}")
-        except Exception as e:
-            texts.append(f"[ERROR scraping {url}]: {e}")
     return "\n\n".join(texts)
  
-def call_llm_generate(content: str, num_questions=5, question_types=["MCQ"]):
-    """Generate a list of quiz questions from scraped content."""
-    prompt = f"""
-You are a helpful quiz generator assistant.
- 
-From the text content below, generate {num_questions} quiz questions.
-Use types: {question_types}.
- 
-Return a JSON array like this:
+QUIZ_BATCH_SIZE = int(os.getenv("QUIZ_BATCH_SIZE", 1))          # questions per generation task
+QUIZ_CONCURRENCY = int(os.getenv("QUIZ_CONCURRENCY", 4))        # tasks in flight per quiz
+QUIZ_TASK_RETRIES = int(os.getenv("QUIZ_TASK_RETRIES", 2))      # re-asks for a task's missing items
  
-[
- {{
+QUESTION_TEMPLATES = {
+    "MCQ": """{{
    "type": "MCQ",
    "question": "...",
    "options": ["A", "B", "C", "D"],
    "correct_answer": ["A"]
- }},
- {{
+ }}""",
+    "ShortAnswer": """{{
    "type": "ShortAnswer",
    "question": "...",
    "options": [],
    "correct_answer": "..."
- }},
- {{
+ }}""",
+    "Coding": """{{
    "type": "Coding",
    "question": "...",
    "options": [],
@@ -72,27 +53,146 @@ Return a JSON array like this:
        "expected_output": 3
      }}
    ]
- }}
+ }}""",
+}
+ 
+def plan_question_types(num_questions: int, question_types: list) -> list:
+    """Spread num_questions over the requested types as evenly as possible, interleaved."""
+    types = [t for t in question_types if t in QUESTION_TEMPLATES] or ["MCQ"]
+    return [types[i % len(types)] for i in range(num_questions)]
+ 
+def _parse_items(raw: str) -> list:
+    """Every JSON object in a completion, even when the surrounding array is malformed."""
+    cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw.strip())
+    try:
+        data = json.loads(cleaned)
+        return data if isinstance(data, list) else [data]
+    except json.JSONDecodeError:
+        pass
+    # Salvage the well-formed objects one by one; a broken item only loses itself
+    decoder, items, pos = json.JSONDecoder(), [], 0
+    while (start := cleaned.find("{", pos)) != -1:
+        try:
+            item, pos = decoder.raw_decode(cleaned, start)
+            items.append(item)
+        except json.JSONDecodeError:
+            pos = start + 1
+    return items
+ 
+def _parse_reply(raw: str) -> list:
+    """_parse_items, rejecting a reply without a single usable question so it isn't cached."""
+    items = _parse_items(raw)
+    if not any(_as_question(item, qtype) for item in items for qtype in QUESTION_TEMPLATES):
+        raise ValueError("Reply contains no valid question.")
+    return items
+
+
+def _as_question(item, qtype: str):
+    """The item validated and normalized as a qtype question (see Questions.py), or None."""
+    try:
+        return parse_question(item, qtype).to_dict()
+    except QuestionError:
+        return None
+ 
+def _question_key(item: dict) -> str:
+    return " ".join(re.sub(r"[^\w\s]", "", str(item["question"]).lower()).split())
+ 
+def _task_prompt(slots: list) -> str:
+    types = sorted({qtype for qtype, _ in slots}, key=list(QUESTION_TEMPLATES).index)
+    examples = ",\n ".join(QUESTION_TEMPLATES[t] for t in types)
+    material = "\n\n".join(
+        f"[Material for question {i}] (type: {qtype})\n{context}" for i, (qtype, context) in enumerate(slots, start=1)
+    )
+    return f"""
+You are a helpful quiz generator assistant.
+ 
+From the material below, generate {len(slots)} quiz question(s), question i based on "Material for question i" and of the type given there.
+ 
+Return a JSON array like this:
+ 
+[
+ {examples}
 ]
  
 Only return valid JSON. No explanation.
  
-Content:
-\"\"\"{content}\"\"\"
-"""
+Material:
+\"\"\"{material}\"\"\"
+""".strip()
  
-    response = client.chat.completions.create(
-        model="meta-llama/Llama-3.1-8B-Instruct",
-        messages=[{"role": "system", "content": prompt.strip()}]
-    )
+async def _generate_task(slots: list, limit: asyncio.Semaphore, fresh: bool = False) -> list:
+    """Generate one batch of slots; returns an item or None per slot. Only the slots still
+    missing after a reply are asked again, so a bad item never costs its neighbours."""
+    results = [None] * len(slots)
+    for attempt in range(QUIZ_TASK_RETRIES + 1):
+        missing = [i for i, item in enumerate(results) if item is None]
+        if not missing:
+            break
+        try:
+            async with limit:
+                # A cached reply would just repeat the same bad output, so retries skip the cache
+                items = await achat_completion(
+                    messages=[{"role": "system", "content": _task_prompt([slots[i] for i in missing])}],
+                    cache=not (fresh or attempt),
+                    parse=_parse_reply,
+                )
+        except (LlmError, ValueError) as e:
+            print(f"Quiz generation task failed: {e}")
+            continue
+        for i in missing:
+            # Items are taken in order, each by the first open slot of its type
+            for j, item in enumerate(items):
+                question = _as_question(item, slots[i][0])
+                if question is not None:
+                    results[i] = question
+                    del items[j]
+                    break
+    return results
  
-    raw = response.choices[0].message.content.strip()
-    cleaned = re.sub(r"^```json\s*|\s*```$", "", raw)
+def _drop_duplicates(results: list) -> list:
+    """Clear every slot repeating an earlier question; returns the indices of empty slots."""
+    seen, missing = set(), []
+    for i, item in enumerate(results):
+        key = _question_key(item) if item is not None else None
+        if key is None or key in seen:
+            results[i] = None
+            missing.append(i)
+        else:
+            seen.add(key)
+    return missing
  
-    if not cleaned:
-        raise ValueError("LLM returned empty or null response.")
+async def _generate_all(slots: list) -> list:
+    limit = asyncio.Semaphore(QUIZ_CONCURRENCY)
+    batches = [list(range(i, min(i + QUIZ_BATCH_SIZE, len(slots)))) for i in range(0, len(slots), QUIZ_BATCH_SIZE)]
+    outputs = await asyncio.gather(*[_generate_task([slots[i] for i in batch], limit) for batch in batches])
+    results = [item for output in outputs for item in output]
  
-    try:
-        return json.loads(cleaned)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse LLM response:\n{raw}\n\nError: {e}")
\ No newline at end of file
+    # Reduce: drop duplicates, then re-ask (uncached) once for every empty or duplicate slot
+    missing = _drop_duplicates(results)
+    if missing:
+        refills = await asyncio.gather(*[_generate_task([slots[i]], limit, fresh=True) for i in missing])
+        for i, (item,) in zip(missing, refills):
+            results[i] = item
+        _drop_duplicates(results)
+    return results
+ 
+def call_llm_generate(content: str, num_questions=5, question_types=["MCQ"], topic: str = None):
+    """Generate a list of quiz questions from scraped content.
+
+    Each question gets its own material from the content index (see Content_Index.py)
+    and is generated by an independent task (QUIZ_BATCH_SIZE questions per task, up to
+    QUIZ_CONCURRENCY at once). Results are merged in order, deduplicated and follow the
+    requested type mix; items that still fail after retries are left out rather than
+    failing the quiz.
+    """
+    index = get_content_index(content)
+    query = f"{topic}: {DEFAULT_QUERY}" if topic else DEFAULT_QUERY
+    slots = list(zip(plan_question_types(num_questions, question_types), index.contexts(query, num_questions)))
+ 
+    start = time.perf_counter()
+    results = asyncio.run(_generate_all(slots))
+    quiz = [item for item in results if item is not None]
+    print(f"Quiz: {len(quiz)}/{num_questions} questions in {time.perf_counter() - start:.1f}s")
+    if not quiz:
+        raise ValueError("LLM failed to generate any valid quiz question.")
+    return quiz
@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Questions import parse_question
+
+BANK_PATH = os.getenv("QUESTION_BANK_PATH", os.path.join(".cache", "question_bank.sqlite3"))
+LOW_WATER = int(os.getenv("QUESTION_BANK_LOW_WATER", 3))
+REFILL_BATCH = int(os.getenv("QUESTION_BANK_REFILL_BATCH", 5))
+# A key is refilled at most once per cooldown, and only a few keys refill at a time
+REFILL_COOLDOWN = float(os.getenv("QUESTION_BANK_REFILL_COOLDOWN", 900))
+MAX_PENDING_REFILLS = int(os.getenv("QUESTION_BANK_MAX_PENDING_REFILLS", 4))
+TYPES = ["MCQ", "ShortAnswer", "Coding"]
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+_refill_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="question-bank-refill")
+
+
+def _fingerprint(question: dict) -> str:
+    text = " ".join(str(question.get("question", "")).lower().split())
+    return hashlib.sha256(f"{question.get('type')}|{text}".encode()).hexdigest()
+
+
+class QuestionBank:
+    """Pre-generated questions in SQLite, indexed by (topic, tag, type, difficulty).
+
+    question_keys is a WITHOUT ROWID table whose primary key is the lookup key, so a draw
+    is one B-tree seek plus a short range scan past questions this student has already seen.
+    """
+
+    def __init__(self, path: str = BANK_PATH, generate=None, low_water: int = LOW_WATER, refill_batch: int = REFILL_BATCH):
+        self.path = path
+        self.generate = generate
+        self.low_water = low_water
+        self.refill_batch = refill_batch
+        self._lock = threading.Lock()
+        self._refilling = set()
+        self._last_refill = {}
+        self.refills = 0
+        self.refills_skipped = 0
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS questions (
+                    id INTEGER PRIMARY KEY,
+                    topic TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    tags TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL UNIQUE
+                );
+                CREATE TABLE IF NOT EXISTS question_keys (
+                    topic TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    PRIMARY KEY (topic, tag, type, difficulty, question_id)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS served (
+                    student_id TEXT NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    PRIMARY KEY (student_id, question_id)
+                ) WITHOUT ROWID;
+            """)
+
+    # === Writes ===
+    def add(self, topic: str, tags: list, qtype: str, difficulty: str, question):
+        """Store a question under every one of its tags. Returns (question_id, created);
+        a duplicate of a stored question returns the existing id with created=False."""
+        question = parse_question(question).to_dict()
+        fingerprint = _fingerprint(question)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT id FROM questions WHERE fingerprint = ?", (fingerprint,)).fetchone()
+            if row is not None:
+                return row[0], False
+            cursor = self._conn.execute(
+                "INSERT INTO questions (topic, type, difficulty, tags, payload, fingerprint) VALUES (?, ?, ?, ?, ?, ?)",
+                (topic, qtype, difficulty, json.dumps(tags), json.dumps(question), fingerprint),
+            )
+            question_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO question_keys VALUES (?, ?, ?, ?, ?)",
+                [(topic, tag, qtype, difficulty, question_id) for tag in tags],
+            )
+        return question_id, True
+
+    def mark_served(self, student_id: str, question_id: int):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO served VALUES (?, ?)", (student_id, question_id))
+
+    # === Reads ===
+    _UNSEEN = """
+        SELECT k.question_id FROM question_keys k
+        WHERE k.topic = ? AND k.tag = ? AND k.type = ? AND k.difficulty = ?
+          AND NOT EXISTS (SELECT 1 FROM served s WHERE s.student_id = ? AND s.question_id = k.question_id)
+        LIMIT ?
+    """
+
+    def _unseen(self, topic, tag, qtype, difficulty, student_id, limit):
+        return [row[0] for row in self._conn.execute(self._UNSEEN, (topic, tag, qtype, difficulty, student_id, limit))]
+
+    def draw(self, topic: str, tags: list, qtype: str, difficulty: str, student_id: str):
+        """Return (question, question_tags) the student hasn't seen yet, or None on a miss."""
+        found = None
+        with self._lock:
+            for tag in tags:
+                ids = self._unseen(topic, tag, qtype, difficulty, student_id, self.low_water + 1)
+                if len(ids) <= self.low_water:
+                    self._schedule_refill(topic, tag, qtype, difficulty)
+                if ids and found is None:
+                    found = ids[0]
+            if found is None:
+                self.misses += 1
+                return None
+            payload, question_tags = self._conn.execute(
+                "SELECT payload, tags FROM questions WHERE id = ?", (found,)
+            ).fetchone()
+            with self._conn:
+                self._conn.execute("INSERT OR IGNORE INTO served VALUES (?, ?)", (student_id, found))
+            self.hits += 1
+        return parse_question(json.loads(payload)), json.loads(question_tags)
+
+    def has_unseen(self, topic: str, tags: list, qtype: str, difficulty: str, student_id: str) -> bool:
+        """Whether draw() would hit, without serving anything or scheduling refills."""
+        with self._lock:
+            return any(self._unseen(topic, tag, qtype, difficulty, student_id, 1) for tag in tags)
+
+    def stock(self, topic: str, tag: str, qtype: str, difficulty: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM question_keys WHERE topic = ? AND tag = ? AND type = ? AND difficulty = ?",
+                (topic, tag, qtype, difficulty),
+            ).fetchone()[0]
+
+    # === Generation ===
+    def fill(self, topic: str, tag: str, qtype: str, difficulty: str, count: int) -> int:
+        """Generate `count` questions for one key. Returns how many new ones were stored."""
+        added = 0
+        for _ in range(count):
+            try:
+                question = self.generate(tag=[tag], type=qtype, difficulty=difficulty)
+            except Exception as e:
+                print(f"Question bank generation failed for {(topic, tag, qtype, difficulty)}: {e}")
+                continue
+            _, created = self.add(topic, [tag], qtype, difficulty, question)
+            added += created
+        return added
+
+    def _schedule_refill(self, topic, tag, qtype, difficulty):
+        # Caller holds self._lock
+        key = (topic, tag, qtype, difficulty)
+        if self.generate is None or key in self._refilling:
+            return
+        last = self._last_refill.get(key)
+        if (last is not None and time.monotonic() - last < REFILL_COOLDOWN) or len(self._refilling) >= MAX_PENDING_REFILLS:
+            # Live generation still stocks the bank; refills only top up keys that are in demand
+            self.refills_skipped += 1
+            return
+        self._refilling.add(key)
+        self._last_refill[key] = time.monotonic()
+        self.refills += 1
+
+        def refill():
+            try:
+                self.fill(topic, tag, qtype, difficulty, self.refill_batch)
+            finally:
+                with self._lock:
+                    self._refilling.discard(key)
+
+        _refill_executor.submit(refill)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+        return {
+            "questions": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "refilling": len(self._refilling),
+            "refills": self.refills,
+            "refills_skipped": self.refills_skipped,
+        }
+
+
+_bank = None
+_bank_lock = threading.Lock()
+
+
+def get_question_bank(generate=None) -> QuestionBank:
+    global _bank
+    if _bank is None:
+        with _bank_lock:
+            if _bank is None:
+                _bank = QuestionBank(generate=generate)
+    if generate is not None and _bank.generate is None:
+        _bank.generate = generate
+    return _bank
+
+
+# === Offline bulk generation ===
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate questions into the local question bank.")
+    parser.add_argument("topic")
+    parser.add_argument("--tags", nargs="*", help="Tags to fill; generated from the topic when omitted.")
+    parser.add_argument("--types", nargs="*", default=TYPES)
+    parser.add_argument("--difficulties", nargs="*", default=DIFFICULTIES)
+    parser.add_argument("--per-key", type=int, default=REFILL_BATCH)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    from Actions import generate_question, generate_tags
+    tags = args.tags or generate_tags(args.topic).get("tags", [])
+    if not tags:
+        raise SystemExit(f"Could not derive tags for {args.topic}")
+
+    bank = get_question_bank(generate_question)
+    keys = [(tag, qtype, difficulty) for tag in tags for qtype in args.types for difficulty in args.difficulties]
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        added = sum(pool.map(lambda key: bank.fill(args.topic, *key, args.per_key), keys))
+    print(f"Added {added} questions across {len(keys)} keys. Bank: {bank.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by all sessions; generation is network-bound so threads are enough
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PREFETCH_WORKERS", 6)),
+    thread_name_prefix="question-prefetch",
+)
+
+
+class QuestionPrefetcher:
+    """Generates likely next questions in the background while the student is answering.
+
+    Candidates are the exact decisions the scheduler is predicted to make. Decisions the
+    question bank can already serve to this student are skipped. When the next decision
+    arrives, take() hands back the candidate with the same type, difficulty and tag set;
+    the rest are added to the bank rather than thrown away.
+    """
+
+    def __init__(self, generate, bank=None):
+        self.generate = generate
+        self.bank = bank
+        self._round = None
+        self._topic = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.discarded = 0
+        self.banked = 0
+
+    def start(self, round_id, decisions: list, topic: str = None, student_id: str = None):
+        """Kick off prefetching for `round_id` (e.g. the question number); repeat calls are no-ops.
+        `decisions` ({"tags", "type", "difficulty"} dicts) are the predicted next picks."""
+        with self._lock:
+            if self._round == round_id:
+                return
+            self._drop_pending()
+            self._round = round_id
+            self._topic = topic
+            for decision in decisions:
+                key = (decision["type"], decision["difficulty"], frozenset(decision["tags"]))
+                if key in self._pending:
+                    continue
+                if self.bank is not None and self.bank.has_unseen(
+                    topic, decision["tags"], decision["type"], decision["difficulty"], student_id
+                ):
+                    # The draw will hit the bank, so generating this one would be wasted
+                    self.skipped += 1
+                    continue
+                future = _executor.submit(
+                    self.generate, tag=decision["tags"], type=decision["type"], difficulty=decision["difficulty"]
+                )
+                self._pending[key] = future
+
+    def take(self, qtype: str, tags: list, difficulty: str, timeout: float = None):
+        """Return the prefetched question for exactly this decision, or None on a miss."""
+        with self._lock:
+            future = self._pending.pop((qtype, difficulty, frozenset(tags)), None)
+            self._drop_pending()
+            self._round = None
+        if future is not None:
+            try:
+                # Still in flight is fine: it started earlier than a fresh call would
+                question = future.result(timeout=timeout)
+                self.hits += 1
+                return question
+            except Exception as e:
+                print(f"Prefetched question failed: {e}")
+        self.misses += 1
+        return None
+
+    def discard(self):
+        with self._lock:
+            self._drop_pending()
+            self._round = None
+
+    def _drop_pending(self):
+        for key, future in self._pending.items():
+            self.discarded += 1
+            if not future.cancel() and self.bank is not None and self._topic is not None:
+                # Already generating or generated: stock the bank with it once it's ready
+                future.add_done_callback(lambda f, key=key, topic=self._topic: self._bank_result(f, key, topic))
+        self._pending = {}
+
+    def _bank_result(self, future, key, topic):
+        if future.exception() is not None:
+            return
+        qtype, difficulty, tags = key
+        try:
+            _, created = self.bank.add(topic, sorted(tags), qtype, difficulty, future.result())
+        except Exception as e:
+            print(f"Could not bank a prefetched question: {e}")
+            return
+        self.banked += created
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "discarded": self.discarded,
+            "banked": self.banked,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
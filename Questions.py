@@ -0,0 +1,192 @@
+import re
+
+from Json_Stream import loads_tolerant
+from Sandbox_Harness import prepare_tests
+
+DEFAULT_TIME_LIMITS = {"MCQ": 120, "ShortAnswer": 120, "Coding": 600}
+
+_OPTION_LABEL = re.compile(r"^\(?([A-Za-z])[\).:]\s*")
+
+
+class QuestionError(ValueError):
+    pass
+
+
+def normalize_text(value) -> str:
+    """Case- and whitespace-insensitive form used for every answer comparison."""
+    return " ".join(str(value).split()).casefold()
+
+
+def parse_answer_list(value) -> list:
+    """A list of answers from a list, a JSON-ish list string ("[A, C]") or a comma-separated string."""
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    text = str(value).strip()
+    if text.startswith("["):
+        try:
+            parsed = loads_tolerant(text)
+            if isinstance(parsed, list):
+                return [str(item) for item in parsed]
+        except ValueError:
+            pass
+        text = text.strip("[] ")
+    return [part.strip().strip("'\"") for part in text.split(",") if part.strip().strip("'\"")]
+
+
+# === Records ===
+class Question:
+    """Base for the typed question records. Built once by parse_question; read-only after that."""
+
+    __slots__ = ("question", "options", "time_limit", "correct_answer")
+    type = None
+
+    def __init__(self, question: str, options: tuple, time_limit: int, correct_answer):
+        self.question = question
+        self.options = options
+        self.time_limit = time_limit
+        self.correct_answer = correct_answer
+
+    def to_dict(self) -> dict:
+        """The generation-time JSON shape, with normalized values."""
+        return {
+            "question": self.question,
+            "options": list(self.options),
+            "type": self.type,
+            "correct_answer": self.correct_answer,
+            "time_limit": self.time_limit,
+        }
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.question[:60]!r})"
+
+
+class MCQQuestion(Question):
+    __slots__ = ("answer_set",)
+    type = "MCQ"
+
+    def __init__(self, question, options, time_limit, correct_answer):
+        super().__init__(question, options, time_limit, correct_answer)
+        self.answer_set = frozenset(normalize_text(answer) for answer in correct_answer)
+
+    def score(self, chosen: list) -> float:
+        """Share of the correct options that were chosen (same rule as evaluate_mcq)."""
+        return len(self.answer_set.intersection(normalize_text(c) for c in chosen)) / len(self.answer_set)
+
+    def to_dict(self) -> dict:
+        return dict(super().to_dict(), correct_answer=list(self.correct_answer))
+
+
+class ShortAnswerQuestion(Question):
+    __slots__ = ("normalized_answer",)
+    type = "ShortAnswer"
+
+    def __init__(self, question, options, time_limit, correct_answer):
+        super().__init__(question, options, time_limit, correct_answer)
+        self.normalized_answer = normalize_text(correct_answer)
+
+
+class CodingQuestion(Question):
+    __slots__ = ("tests",)
+    type = "Coding"
+
+    def __init__(self, question, options, time_limit, correct_answer, tests):
+        super().__init__(question, options, time_limit, correct_answer)
+        self.tests = tests
+
+    @property
+    def test_cases(self) -> list:
+        return [{"input": t["input"], "expected_output": t["expected_output"]} for t in self.tests]
+
+    def to_dict(self) -> dict:
+        return dict(super().to_dict(), test_cases=self.test_cases)
+
+
+QUESTION_CLASSES = {cls.type: cls for cls in (MCQQuestion, ShortAnswerQuestion, CodingQuestion)}
+
+
+# === Validation ===
+def _resolve_option(answer: str, options: tuple, by_text: dict):
+    """Map an answer given as option text, "B) text", "B)" or a bare letter to its option."""
+    key = normalize_text(answer)
+    if key in by_text:
+        return by_text[key]
+    label = _OPTION_LABEL.match(answer)
+    rest = normalize_text(answer[label.end():]) if label else key
+    if label and rest in by_text:
+        return by_text[rest]
+    letter = label.group(1).lower() if label and not rest else key
+    if len(letter) == 1 and "a" <= letter <= "z" and ord(letter) - ord("a") < len(options):
+        return options[ord(letter) - ord("a")]
+    return None
+
+
+def parse_question(data, expected_type: str = None) -> Question:
+    """Validate and normalize one generated question in a single pass.
+
+    Raises QuestionError naming the first problem, so a bad generation is rejected (and
+    can be regenerated) before it ever reaches a student.
+    """
+    if isinstance(data, Question):
+        return data
+    if not isinstance(data, dict):
+        raise QuestionError(f"Question must be an object, got {type(data).__name__}.")
+    qtype = data.get("type")
+    cls = QUESTION_CLASSES.get(qtype)
+    if cls is None:
+        raise QuestionError(f"Unknown question type {qtype!r}.")
+    if expected_type and qtype != expected_type:
+        raise QuestionError(f"Asked for a {expected_type} question, got {qtype}.")
+    text = data.get("question")
+    if not isinstance(text, str) or not text.strip():
+        raise QuestionError("Question text is missing.")
+    text = text.strip()
+
+    time_limit = data.get("time_limit")
+    if isinstance(time_limit, bool) or not isinstance(time_limit, (int, float)) or time_limit <= 0:
+        time_limit = DEFAULT_TIME_LIMITS[qtype]
+
+    if qtype == "MCQ":
+        raw_options = data.get("options")
+        if not isinstance(raw_options, list):
+            raise QuestionError("MCQ options must be a list.")
+        options = tuple(" ".join(str(option).split()) for option in raw_options)
+        by_text = {}
+        for option in options:
+            key = normalize_text(option)
+            if not key or key in by_text:
+                raise QuestionError("MCQ options must be distinct and non-empty.")
+            by_text[key] = option
+            # "A) text" options also answer to their bare text
+            label = _OPTION_LABEL.match(option)
+            if label:
+                by_text.setdefault(normalize_text(option[label.end():]), option)
+        if len(options) < 2:
+            raise QuestionError("MCQ needs at least two options.")
+        answers = []
+        for answer in parse_answer_list(data.get("correct_answer", "")):
+            option = _resolve_option(answer, options, by_text)
+            if option is None:
+                raise QuestionError(f"Correct answer {answer!r} is not one of the options.")
+            if option not in answers:
+                answers.append(option)
+        if not answers:
+            raise QuestionError("MCQ has no correct answer.")
+        return MCQQuestion(text, options, int(time_limit), tuple(answers))
+
+    if qtype == "ShortAnswer":
+        answer = data.get("correct_answer")
+        if isinstance(answer, list):
+            answer = " ".join(str(part) for part in answer)
+        if not isinstance(answer, str) or not answer.strip():
+            raise QuestionError("ShortAnswer has no model answer.")
+        return ShortAnswerQuestion(text, (), int(time_limit), answer.strip())
+
+    test_cases = data.get("test_cases")
+    if not isinstance(test_cases, list) or not test_cases:
+        raise QuestionError("Coding question has no test cases.")
+    for test in test_cases:
+        if not isinstance(test, dict) or "input" not in test or test.get("expected_output") is None:
+            raise QuestionError("Every test case needs an input and a non-null expected_output.")
+    answer = data.get("correct_answer", "")
+    return CodingQuestion(text, (), int(time_limit), answer if isinstance(answer, str) else str(answer),
+                          prepare_tests(test_cases))
@@ -0,0 +1,183 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from Sandbox_Pool import SandboxConfig, get_container_pool
+
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+ISOLATION_FAILED_EXIT = 125
+
+# Exec'd as a fresh interpreter (no preexec_fn, which isn't safe to run in a child forked
+# from the runner's worker threads). Applies the rlimits, moves into an empty user+network
+# namespace, then execs the real program; if any step fails it exits without running it.
+LAUNCHER = r"""
+import ctypes, os, resource, sys
+cpu, address_space, open_files, file_size, processes = (int(v) for v in sys.argv[1:6])
+try:
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+    resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (open_files, open_files))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (file_size, file_size))
+    resource.setrlimit(resource.RLIMIT_NPROC, (processes, processes))
+    if ctypes.CDLL(None, use_errno=True).unshare(%d | %d) != 0:
+        raise OSError(ctypes.get_errno(), "unshare: " + os.strerror(ctypes.get_errno()))
+except (OSError, ValueError) as e:
+    sys.stderr.write("Sandbox isolation failed: %%s\n" %% e)
+    sys.exit(%d)
+os.execv(sys.executable, [sys.executable, "-I", "-S", "-c", sys.argv[6]])
+""" % (CLONE_NEWUSER, CLONE_NEWNET, ISOLATION_FAILED_EXIT)
+
+# Prepended to every program as an extra guard; the namespace above is what actually cuts
+# the network off (this alone is bypassed by importing _socket)
+NETWORK_GUARD = """
+import socket as _socket
+def _no_network(*args, **kwargs):
+    raise PermissionError("Network access is disabled in the sandbox")
+_socket.socket = _socket.create_connection = _socket.getaddrinfo = _no_network
+del _socket, _no_network
+"""
+
+
+def _parse_size(value: str) -> int:
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    value = str(value).strip().lower()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+class SandboxIsolationError(RuntimeError):
+    pass
+
+
+class SandboxBackend:
+    """Somewhere to run untrusted python. `session()` yields an object with
+    run_python(source, timeout) -> (exit_code, stdout, stderr)."""
+
+    name = "base"
+
+    def __init__(self, config: SandboxConfig = None):
+        self.config = config or SandboxConfig.from_env()
+
+    @property
+    def capacity(self):
+        """How many sessions can really run at once; None when only the host limits it."""
+        return None
+
+    @contextmanager
+    def session(self):
+        raise NotImplementedError
+
+
+class DockerBackend(SandboxBackend):
+    """Warm containers from the shared ContainerPool."""
+
+    name = "docker"
+
+    def __init__(self, config: SandboxConfig = None, pool=None):
+        self.pool = pool or get_container_pool()
+        super().__init__(config or self.pool.config)
+
+    @property
+    def capacity(self):
+        return self.pool.config.pool_size
+
+    @contextmanager
+    def session(self):
+        with self.pool.lease() as sandbox:
+            yield sandbox
+
+
+def _kill_group(proc: subprocess.Popen):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass  # the whole group has already exited
+
+
+class LocalSandbox:
+    """A scratch directory plus a resource-limited child interpreter per run."""
+
+    def __init__(self, config: SandboxConfig, workdir: str):
+        self.config = config
+        self.workdir = workdir
+
+    def _argv(self, program: str) -> list:
+        cfg = self.config
+        limits = [cfg.local_cpu_seconds, _parse_size(cfg.local_address_space), cfg.local_max_open_files, 16 * 1024 ** 2,
+                  cfg.local_max_processes]
+        return [sys.executable, "-I", "-S", "-c", LAUNCHER] + [str(v) for v in limits] + [program]
+
+    def run_python(self, source: str, timeout: int):
+        program = NETWORK_GUARD + source
+        # The child leads its own process group, so killing the group also takes down
+        # anything it forked, on a timeout and after a normal exit alike
+        proc = subprocess.Popen(
+            self._argv(program),
+            cwd=self.workdir,
+            env={"PATH": "/usr/bin:/bin", "HOME": self.workdir, "PYTHONDONTWRITEBYTECODE": "1"},
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        try:
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                _kill_group(proc)
+                stdout, _ = proc.communicate()
+                return 124, stdout.decode(errors="replace"), f"Timed out after {timeout}s"
+        finally:
+            _kill_group(proc)
+        if proc.returncode == ISOLATION_FAILED_EXIT and stderr.startswith(b"Sandbox isolation failed"):
+            # Fail closed: never fall back to running user code with the network reachable
+            raise SandboxIsolationError(stderr.decode(errors="replace").strip())
+        return proc.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+
+class LocalBackend(SandboxBackend):
+    """Docker-free backend: a local subprocess with rlimits, no network and a scratch cwd.
+    Starts in milliseconds, so it also suits CI and benchmarks."""
+
+    name = "local"
+
+    @contextmanager
+    def session(self):
+        workdir = tempfile.mkdtemp(prefix="sandbox-")
+        # The child drops into an unmapped user namespace, so it needs world access to write here
+        os.chmod(workdir, 0o777)
+        try:
+            yield LocalSandbox(self.config, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+BACKENDS = {
+    DockerBackend.name: DockerBackend,
+    LocalBackend.name: LocalBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_sandbox_backend(name: str = None) -> SandboxBackend:
+    """Return the process-wide backend selected by name or by SANDBOX_BACKEND."""
+    name = name or SandboxConfig.from_env().backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown sandbox backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                backend = BACKENDS[name]()
+                _backends[name] = backend
+    return backend
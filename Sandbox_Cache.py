@@ -0,0 +1,66 @@
+import copy
+import os
+
+from Cache import TieredCache, stable_hash
+from Sandbox_Harness import prepare_tests
+
+# === Submission result cache ===
+# Identical code against identical tests under identical limits gives the same verdict,
+# so resubmissions and re-graded reference solutions skip the sandbox entirely.
+_cache = TieredCache(
+    max_entries=int(os.getenv("SANDBOX_CACHE_ENTRIES", 2048)),
+    directory=os.getenv("SANDBOX_CACHE_DIR") or None,
+    max_bytes=int(os.getenv("SANDBOX_CACHE_MAX_BYTES", 64 * 1024 ** 2)),
+)
+
+
+def normalize_code(code: str) -> str:
+    """Line endings and blank lines before and after the code share a cache entry. Whitespace
+    inside lines is kept: it can sit in a string literal or a continued line and change the output."""
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    while lines and not lines[-1].strip():
+        lines.pop()
+    return "\n".join(lines)
+
+
+def submission_key(code: str, testcases: list, config, mode: str, fail_fast: bool) -> str:
+    limits = {
+        "backend": config.backend,
+        "image": config.image,
+        "mem_limit": config.mem_limit,
+        "cpu_quota": config.cpu_quota,
+        "exec_timeout": config.exec_timeout,
+        "test_timeout": config.test_timeout,
+        "local_cpu_seconds": config.local_cpu_seconds,
+        "local_address_space": config.local_address_space,
+        "local_max_open_files": config.local_max_open_files,
+        "local_max_processes": config.local_max_processes,
+        "pids_limit": config.pids_limit,
+        "user": config.user,
+    }
+    return stable_hash(normalize_code(code), prepare_tests(testcases).fingerprint, limits, mode, fail_fast)
+
+
+def _cacheable(result: dict) -> bool:
+    # Timeouts and killed runs depend on host load, not just on the code
+    for detail in result.get("details", []):
+        error = str(detail.get("error", ""))
+        if "Timed out" in error or "terminated" in error:
+            return False
+    return True
+
+
+def get_cached_result(key: str):
+    # Callers may annotate the result they get back; keep the cached copy pristine
+    return copy.deepcopy(_cache.get(key))
+
+
+def store_result(key: str, result: dict):
+    if _cacheable(result):
+        _cache.set(key, result)
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,208 @@
+import json
+import uuid
+
+from Cache import stable_hash
+
+# Runs inside the sandbox interpreter. Loads `solution` once, then evaluates each test
+# with its own timer, exception capture and stdout buffer. Results are written as one
+# JSON line tagged with a per-run marker, so prints from user code can't be mistaken for it.
+# The interpreter only ever sees the call strings: user code can read anything in this
+# process, so expected outputs stay on the host and check_results compares there.
+HARNESS_TEMPLATE = r'''
+import contextlib, io, json, os, signal, sys, time
+
+PAYLOAD = json.loads(%(payload)r)
+_result_stream = os.fdopen(os.dup(1), "w")
+_MAX_CAPTURE = 2000
+
+
+class _TestTimeout(BaseException):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _TestTimeout()
+
+
+signal.signal(signal.SIGALRM, _on_alarm)
+
+
+def _guarded(fn, timeout):
+    buf = io.StringIO()
+    start = time.perf_counter()
+    value, error = None, None
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+            value = fn()
+    except _TestTimeout:
+        error = "Timed out after %%ss" %% timeout
+    except BaseException as e:
+        error = "%%s: %%s" %% (type(e).__name__, e)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    return value, error, time.perf_counter() - start, buf.getvalue()[:_MAX_CAPTURE]
+
+
+namespace = {"__name__": "__solution__"}
+_, load_error, load_time, _ = _guarded(lambda: exec(PAYLOAD["code"], namespace), PAYLOAD["load_timeout"])
+if load_error is None and not callable(namespace.get("solution")):
+    load_error = "NameError: no function named 'solution' was defined"
+
+results = []
+if load_error is None:
+    for index, test in enumerate(PAYLOAD["tests"]):
+        call = "solution(%%s)" %% test["input"]
+        value, error, elapsed, captured = _guarded(lambda: eval(call, namespace), PAYLOAD["test_timeout"])
+        entry = {"index": index, "time": elapsed, "stdout": captured}
+        if error is not None:
+            entry.update(status="error", error=error)
+        else:
+            entry.update(status="ran", got=str(value).strip())
+        results.append(entry)
+        # Wrong answers are only known on the host; errors can stop the run here
+        if PAYLOAD.get("fail_fast") and error is not None:
+            break
+
+_result_stream.write(PAYLOAD["marker"] + json.dumps({
+    "load_error": load_error,
+    "load_time": load_time,
+    "results": results,
+}) + "\n")
+_result_stream.flush()
+'''
+
+
+# === Prepared test cases ===
+def _prepare_test(test: dict) -> dict:
+    call = str(test["input"])
+    expected = str(test["expected_output"]).strip()
+    return {
+        "input": test["input"],
+        "expected_output": test["expected_output"],
+        "call": call,
+        "expected": expected,
+        "harness": json.dumps({"input": call}),
+    }
+
+
+class PreparedTests(tuple):
+    """Test cases with their call string, expected output and harness JSON computed once.
+    The harness JSON holds only the call; expected outputs never enter the sandbox.
+
+    Questions prepare their tests at generation time, so grading a submission only joins
+    pre-serialized strings. Slices stay prepared, so chunked runs don't redo the work.
+    """
+
+    def __new__(cls, testcases):
+        tests = super().__new__(cls, (t if "harness" in t else _prepare_test(t) for t in testcases))
+        tests.fingerprint = stable_hash([[t["harness"], t["expected"]] for t in tests])
+        return tests
+
+    def __getitem__(self, index):
+        item = super().__getitem__(index)
+        return PreparedTests(item) if isinstance(index, slice) else item
+
+    def harness_json(self) -> str:
+        return "[" + ", ".join(t["harness"] for t in self) + "]"
+
+
+def prepare_tests(testcases) -> PreparedTests:
+    return testcases if isinstance(testcases, PreparedTests) else PreparedTests(testcases)
+
+
+def build_harness(code: str, testcases: list, test_timeout: float, load_timeout: float = 5, fail_fast: bool = False):
+    """Return (source, marker) for a single interpreter run covering every test case."""
+    marker = f"__HARNESS_{uuid.uuid4().hex}__"
+    # The tests are spliced in already serialized; only the small settings dict is dumped here
+    settings = json.dumps({
+        "code": code.strip(),
+        "test_timeout": test_timeout,
+        "load_timeout": load_timeout,
+        "fail_fast": fail_fast,
+        "marker": marker,
+    })
+    payload = '{"tests": %s, %s' % (prepare_tests(testcases).harness_json(), settings[1:])
+    return HARNESS_TEMPLATE % {"payload": payload}, marker
+
+
+def parse_harness_output(stdout: str, marker: str):
+    """Pull the tagged JSON report out of the harness stdout, or None if it never got written.
+    Only the last marker line counts; the harness writes its report after all user code ran."""
+    for line in reversed(stdout.splitlines()):
+        if line.startswith(marker):
+            try:
+                report = json.loads(line[len(marker):])
+            except ValueError:
+                return None
+            return report if isinstance(report, dict) and isinstance(report.get("results"), list) else None
+    return None
+
+
+def check_results(testcases: list, results: list, fail_fast: bool = False) -> list:
+    """Grade the raw harness entries against the expected outputs, on the host.
+
+    Entries are matched to tests by position; anything malformed or out of range is
+    dropped (and so reported as not run). With fail_fast, entries after the first
+    non-passing test are dropped too.
+    """
+    checked = []
+    for entry in results:
+        if not isinstance(entry, dict) or entry.get("index") not in range(len(testcases)):
+            continue
+        index = entry["index"]
+        if entry.get("status") == "ran":
+            got = str(entry.get("got", ""))
+            status = "passed" if got == testcases[index]["expected"] else "failed"
+            entry = {"index": index, "time": entry.get("time"), "stdout": entry.get("stdout", ""), "status": status, "got": got}
+        else:
+            entry = {"index": index, "time": entry.get("time"), "stdout": entry.get("stdout", ""),
+                     "status": "error", "error": str(entry.get("error", "Unknown error"))}
+        checked.append(entry)
+        if fail_fast and entry["status"] != "passed":
+            break
+    return checked
+
+
+def summarize_harness_report(testcases: list, report, failure: str = ""):
+    """Convert a harness report into the passed/failed/total/details result shape."""
+    passed = 0
+    failed = 0
+    errors = []
+    timings = []
+    by_index = {}
+    if report is not None and not report.get("load_error"):
+        by_index = {entry["index"]: entry for entry in report["results"]}
+    elif report is not None:
+        failure = report["load_error"]
+
+    for index, test in enumerate(testcases):
+        test_input = test["input"]
+        entry = by_index.get(index)
+        if entry is None:
+            # Never ran: solution failed to load, the run was killed, or fail_fast stopped early
+            failed += 1
+            timings.append(None)
+            errors.append({"input": test_input, "error": failure or "Not run"})
+            continue
+        timings.append(entry["time"])
+        if entry["status"] == "passed":
+            passed += 1
+        elif entry["status"] == "failed":
+            failed += 1
+            errors.append({
+                "input": test_input,
+                "expected": str(test["expected_output"]),
+                "got": entry["got"]
+            })
+        else:
+            failed += 1
+            errors.append({"input": test_input, "error": entry["error"]})
+
+    return {
+        "passed": passed,
+        "failed": failed,
+        "total": len(testcases),
+        "details": errors,
+        "timings": timings,
+    }
@@ -0,0 +1,275 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass
+class SandboxConfig:
+    image: str = "python:3.10-slim"
+    pool_size: int = 2
+    max_uses: int = 20               # recycle a container after this many submissions
+    mem_limit: str = "128m"
+    cpu_quota: int = 50000
+    pids_limit: int = 64
+    exec_timeout: int = 10           # seconds per python invocation inside the container
+    test_timeout: float = 5.0        # seconds per test case in harness mode
+    mode: str = "harness"            # "harness" (one interpreter per submission) or "per_test"
+    backend: str = "docker"          # "docker" (warm container pool) or "local" (rlimited subprocess)
+    local_cpu_seconds: int = 30
+    local_address_space: str = "512m"
+    local_max_open_files: int = 64
+    local_max_processes: int = 64    # RLIMIT_NPROC; counts every process of the sandbox's uid
+    health_check_interval: float = 30.0
+    acquire_timeout: float = 60.0
+    workdir: str = "/sandbox"
+    user: str = "65534:65534"         # nobody; with a read-only root only the tmpfs mounts are writable
+    labels: dict = field(default_factory=lambda: {"intelligent-evaluator": "sandbox"})
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            image=os.getenv("SANDBOX_IMAGE", cls.image),
+            pool_size=_env_int("SANDBOX_POOL_SIZE", cls.pool_size),
+            max_uses=_env_int("SANDBOX_MAX_USES", cls.max_uses),
+            mem_limit=os.getenv("SANDBOX_MEM_LIMIT", cls.mem_limit),
+            cpu_quota=_env_int("SANDBOX_CPU_QUOTA", cls.cpu_quota),
+            exec_timeout=_env_int("SANDBOX_EXEC_TIMEOUT", cls.exec_timeout),
+            test_timeout=_env_float("SANDBOX_TEST_TIMEOUT", cls.test_timeout),
+            mode=os.getenv("SANDBOX_MODE", cls.mode),
+            backend=os.getenv("SANDBOX_BACKEND", cls.backend),
+            local_cpu_seconds=_env_int("SANDBOX_LOCAL_CPU_SECONDS", cls.local_cpu_seconds),
+            local_address_space=os.getenv("SANDBOX_LOCAL_ADDRESS_SPACE", cls.local_address_space),
+            local_max_open_files=_env_int("SANDBOX_LOCAL_MAX_OPEN_FILES", cls.local_max_open_files),
+            local_max_processes=_env_int("SANDBOX_LOCAL_MAX_PROCESSES", cls.local_max_processes),
+            health_check_interval=_env_float("SANDBOX_HEALTH_INTERVAL", cls.health_check_interval),
+            user=os.getenv("SANDBOX_USER", cls.user),
+        )
+
+
+class PooledContainer:
+    """A pre-started container plus the bookkeeping the pool needs to recycle it."""
+
+    def __init__(self, container):
+        self.container = container
+        self.uses = 0
+        self.last_checked = time.monotonic()
+
+    @property
+    def id(self):
+        return self.container.id
+
+    def run_python(self, source: str, timeout: int):
+        """Run `python -c source` inside the container. Returns (exit_code, stdout, stderr)."""
+        exit_code, output = self.container.exec_run(
+            ["timeout", "-s", "KILL", str(timeout), "python", "-c", source],
+            demux=True,
+        )
+        stdout, stderr = output or (None, None)
+        return (
+            exit_code,
+            (stdout or b"").decode(errors="replace"),
+            (stderr or b"").decode(errors="replace"),
+        )
+
+
+SPAWN_RETRY_DELAY = 5.0        # first backfill retry after a failed spawn; doubles up to the max
+SPAWN_RETRY_MAX_DELAY = 60.0
+
+
+class ContainerPool:
+    def __init__(self, config: SandboxConfig = None, client=None):
+        self.config = config or SandboxConfig.from_env()
+        self._client = client
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._live = 0
+        self._started = False
+        self._backfill_pending = 0
+        self.spawn_failures = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            import docker
+            self._client = docker.from_env()
+        return self._client
+
+    # === Lifecycle ===
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.config.pool_size):
+            self._replace()
+
+    def _spawn(self) -> PooledContainer:
+        cfg = self.config
+        container = self.client.containers.run(
+            image=cfg.image,
+            command=["sleep", "infinity"],
+            detach=True,
+            network_disabled=True,
+            mem_limit=cfg.mem_limit,
+            cpu_quota=cfg.cpu_quota,
+            pids_limit=cfg.pids_limit,
+            working_dir=cfg.workdir,
+            # Read-only image and a non-root user: a submission can't patch the stdlib or
+            # site-packages for the next student. Only these tmpfs mounts are writable, and
+            # _reset empties both between submissions.
+            read_only=True,
+            user=cfg.user,
+            tmpfs={cfg.workdir: "size=16m,mode=1777", "/tmp": "size=16m,mode=1777"},
+            environment={"HOME": "/tmp", "PYTHONDONTWRITEBYTECODE": "1"},
+            labels=cfg.labels,
+            auto_remove=True,
+        )
+        with self._lock:
+            self._live += 1
+        return PooledContainer(container)
+
+    def _replace(self, delay: float = 0.0):
+        """Put a fresh container in the pool. A failed spawn is logged and retried in the
+        background with backoff, so the pool grows back instead of staying short."""
+        try:
+            self._idle.put(self._spawn())
+            return
+        except Exception as e:
+            with self._lock:
+                self.spawn_failures += 1
+                self._backfill_pending += 1
+                started = self._started
+            print(f"Sandbox container spawn failed: {e}")
+        if not started:
+            with self._lock:
+                self._backfill_pending -= 1
+            return
+        delay = min(max(delay * 2, SPAWN_RETRY_DELAY), SPAWN_RETRY_MAX_DELAY)
+
+        def retry():
+            with self._lock:
+                self._backfill_pending -= 1
+            if self._started:
+                self._replace(delay)
+
+        timer = threading.Timer(delay, retry)
+        timer.daemon = True
+        timer.start()
+
+    def _discard(self, pooled: PooledContainer):
+        with self._lock:
+            self._live -= 1
+        try:
+            pooled.container.kill()
+        except Exception:
+            pass
+
+    def shutdown(self):
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
+        with self._lock:
+            self._started = False
+
+    # === Health / cleanup ===
+    def _healthy(self, pooled: PooledContainer) -> bool:
+        if time.monotonic() - pooled.last_checked < self.config.health_check_interval:
+            return True
+        try:
+            pooled.container.reload()
+            if pooled.container.status != "running":
+                return False
+            exit_code, _ = pooled.container.exec_run(["true"])
+            pooled.last_checked = time.monotonic()
+            return exit_code == 0
+        except Exception:
+            return False
+
+    def _reset(self, pooled: PooledContainer) -> bool:
+        # PID 1 is `sleep infinity`, so `kill -9 -1` only removes leftovers from the submission.
+        # Everything else is read-only, so emptying the two tmpfs mounts restores a clean state.
+        try:
+            exit_code, _ = pooled.container.exec_run(
+                ["sh", "-c", f"kill -9 -1 2>/dev/null; find {self.config.workdir} /tmp -mindepth 1 -delete"]
+            )
+            return exit_code == 0
+        except Exception:
+            return False
+
+    # === Checkout ===
+    def acquire(self) -> PooledContainer:
+        self.start()
+        while True:
+            try:
+                pooled = self._idle.get(timeout=self.config.acquire_timeout)
+            except queue.Empty:
+                raise TimeoutError("No sandbox container became available.")
+            if self._healthy(pooled):
+                return pooled
+            self._discard(pooled)
+            self._replace()
+
+    def release(self, pooled: PooledContainer, recycle: bool = False):
+        # Never raises: it runs in lease()'s finally and must not mask the caller's exception
+        pooled.uses += 1
+        if recycle or pooled.uses >= self.config.max_uses or not self._reset(pooled):
+            self._discard(pooled)
+            self._replace()
+        else:
+            self._idle.put(pooled)
+
+    @contextmanager
+    def lease(self):
+        """Check out a clean container for one submission and hand it back afterwards."""
+        pooled = self.acquire()
+        recycle = False
+        try:
+            yield pooled
+        except Exception:
+            recycle = True
+            raise
+        finally:
+            self.release(pooled, recycle=recycle)
+
+    def stats(self) -> dict:
+        return {
+            "live": self._live,
+            "idle": self._idle.qsize(),
+            "pool_size": self.config.pool_size,
+            "spawn_failures": self.spawn_failures,
+            "backfill_pending": self._backfill_pending,
+        }
+
+
+# === Process-wide pool ===
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_container_pool() -> ContainerPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ContainerPool()
+    return _pool
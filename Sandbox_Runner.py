@@ -0,0 +1,116 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from Sandbox_Harness import build_harness, check_results, prepare_tests, parse_harness_output, summarize_harness_report
+from Sandbox_Backends import get_sandbox_backend
+
+
+class SandboxUnavailable(RuntimeError):
+    """No sandbox could run the submission (pool exhausted, Docker down, isolation failed).
+    Says nothing about the code, so callers must not grade it as wrong."""
+
+
+# === Global concurrency cap ===
+# Shared by every Streamlit session and batch job in the process, so exam-time bursts
+# queue here instead of oversubscribing the sandbox host. Never wider than the backend can
+# really run at once, so runs wait here rather than timing out in the container pool.
+MAX_CONCURRENCY = int(os.getenv("SANDBOX_MAX_CONCURRENCY", os.cpu_count() or 2))
+_slots = {}
+_slots_lock = threading.Lock()
+_chunk_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="sandbox-chunk")
+_submission_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="sandbox-submission")
+
+
+def sandbox_slot(backend) -> threading.BoundedSemaphore:
+    """The process-wide run slots for `backend`: min(MAX_CONCURRENCY, backend.capacity)."""
+    slots = _slots.get(backend.name)
+    if slots is None:
+        with _slots_lock:
+            slots = _slots.get(backend.name)
+            if slots is None:
+                slots = _slots[backend.name] = threading.BoundedSemaphore(
+                    max(min(MAX_CONCURRENCY, backend.capacity or MAX_CONCURRENCY), 1)
+                )
+    return slots
+
+
+def _run_chunk(backend, code: str, chunk: list, offset: int, fail_fast: bool, stop: threading.Event):
+    """Run one slice of the test cases in its own harness. Returns (results, failure)."""
+    if stop.is_set():
+        return [], "Not run"
+    cfg = backend.config
+    source, marker = build_harness(code, chunk, test_timeout=cfg.test_timeout, fail_fast=fail_fast)
+    overall_timeout = int(cfg.exec_timeout + cfg.test_timeout * len(chunk))
+    try:
+        with sandbox_slot(backend):
+            with backend.session() as sandbox:
+                exit_code, stdout, stderr = sandbox.run_python(source, overall_timeout)
+    except Exception as e:
+        stop.set()
+        raise SandboxUnavailable(f"{type(e).__name__}: {e}") from e
+
+    report = parse_harness_output(stdout, marker)
+    if report is None:
+        if fail_fast:
+            stop.set()
+        return [], stderr.strip() or f"Sandbox run was terminated (exit code {exit_code})"
+    if report.get("load_error"):
+        # Every chunk would hit the same load error
+        stop.set()
+        return [], report["load_error"]
+
+    results = []
+    for entry in check_results(chunk, report["results"], fail_fast):
+        results.append(dict(entry, index=entry["index"] + offset))
+        if fail_fast and entry["status"] != "passed":
+            stop.set()
+    return results, ""
+
+
+def _split(testcases: list, parts: int):
+    size = -(-len(testcases) // parts)
+    return [(start, testcases[start:start + size]) for start in range(0, len(testcases), size)]
+
+
+def run_submission(code: str, testcases: list, parallel: bool = False, fail_fast: bool = False, backend=None):
+    """Grade one submission in harness mode, optionally spreading test cases over several sandboxes.
+
+    With fail_fast, execution stops after the first failing test; tests that never ran are
+    reported as failed, which is enough when only the score matters. Raises
+    SandboxUnavailable when a slice could not get a sandbox at all.
+    """
+    backend = backend or get_sandbox_backend()
+    testcases = prepare_tests(testcases)
+    if not testcases:
+        return summarize_harness_report(testcases, {"load_error": None, "results": []})
+
+    # More slices than the backend can run at once would only queue (and time out) in acquire()
+    capacity = backend.capacity or MAX_CONCURRENCY
+    parts = max(min(MAX_CONCURRENCY, capacity, len(testcases)), 1) if parallel else 1
+    stop = threading.Event()
+    chunks = _split(testcases, parts)
+    if len(chunks) == 1:
+        outcomes = [_run_chunk(backend, code, chunks[0][1], 0, fail_fast, stop)]
+    else:
+        futures = [
+            _chunk_executor.submit(_run_chunk, backend, code, chunk, offset, fail_fast, stop)
+            for offset, chunk in chunks
+        ]
+        outcomes = [future.result() for future in futures]
+
+    results = []
+    failure = ""
+    for chunk_results, chunk_failure in outcomes:
+        results.extend(chunk_results)
+        failure = failure or chunk_failure
+    return summarize_harness_report(testcases, {"load_error": None, "results": results}, failure)
+
+
+def run_submissions(submissions: list, parallel_tests: bool = False, fail_fast: bool = False):
+    """Grade independent (code, testcases) submissions concurrently. Results keep input order."""
+    futures = [
+        _submission_executor.submit(run_submission, code, testcases, parallel_tests, fail_fast)
+        for code, testcases in submissions
+    ]
+    return [future.result() for future in futures]
@@ -0,0 +1,63 @@
+import math
+import os
+from collections import Counter
+
+# Target share of each question type; picks follow the largest deficit, so 50/20/20
+# behaves as a 5:2:2 ratio at every point in the test.
+TYPE_MIX = {"MCQ": 0.5, "ShortAnswer": 0.2, "Coding": 0.2}
+TAGS_PER_QUESTION = 2
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "local")   # "local" or "llm"
+PRIOR_STD = math.sqrt(0.125)    # std of the Beta(0.5, 0.5) belief prior
+
+
+def difficulty_for(belief: float) -> str:
+    if belief < 0.4:
+        return "easy"
+    if belief > 0.7:
+        return "hard"
+    return "medium"
+
+
+def weakest_tags(beliefs: dict, k: int = TAGS_PER_QUESTION) -> list:
+    return [tag for tag, _ in sorted(beliefs.items(), key=lambda item: item[1])[:k]]
+
+
+def next_type(asked_types: list) -> str:
+    counts = Counter(asked_types)
+    total = len(asked_types) + 1
+    weight = sum(TYPE_MIX.values())
+    # Deficit = how far each type is behind its share after this question; ties go to dict order
+    return max(TYPE_MIX, key=lambda t: TYPE_MIX[t] / weight * total - counts.get(t, 0))
+
+
+def tag_priority(belief: float, uncertainty: float) -> float:
+    # Higher uncertainty → more to gain from asking; lower belief → more to learn
+    return uncertainty + (1.0 - belief)
+
+
+def _uncertainty(tag: str, question_counts: dict, variances: dict) -> float:
+    if variances and tag in variances:
+        return math.sqrt(variances[tag]) / PRIOR_STD
+    return 1.0 / math.sqrt(max(question_counts.get(tag, 1), 1))
+
+
+def next_question(tags: list, beliefs: dict, asked_types: list, question_counts: dict = None,
+                  k: int = TAGS_PER_QUESTION, variances: dict = None) -> dict:
+    """Pick tags, type and difficulty for the next question without a model call.
+
+    Uncertainty comes from posterior variances when given, otherwise from question counts.
+    Returns the same {"tags", "type", "difficulty"} shape as the LLM decision.
+    """
+    question_counts = question_counts or {}
+    candidates = [tag for tag in tags if tag in beliefs] or list(beliefs)
+    ranked = sorted(
+        candidates,
+        key=lambda tag: -tag_priority(beliefs.get(tag, 0.5), _uncertainty(tag, question_counts, variances)),
+    )
+    chosen = ranked[:k]
+    mean_belief = sum(beliefs.get(tag, 0.5) for tag in chosen) / len(chosen) if chosen else 0.5
+    return {
+        "tags": chosen,
+        "type": next_type(asked_types),
+        "difficulty": difficulty_for(mean_belief),
+    }
@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+
+from dotenv import load_dotenv
+
+from Cache import DiskCache, stable_hash
+
+load_dotenv()
+
+SCRAPE_FETCHER = os.getenv("SCRAPE_FETCHER", "firecrawl")   # "firecrawl" or "http"
+SCRAPE_MAX_WORKERS = int(os.getenv("SCRAPE_MAX_WORKERS", 4))
+SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", 30))
+SCRAPE_CACHE_DIR = os.getenv("SCRAPE_CACHE_DIR", os.path.join(".cache", "scrape"))
+SCRAPE_CACHE_TTL = float(os.getenv("SCRAPE_CACHE_TTL", 24 * 3600))
+SCRAPE_CACHE_MAX_BYTES = int(os.getenv("SCRAPE_CACHE_MAX_BYTES", 128 * 1024 ** 2))
+FIRECRAWL_API_URL = os.getenv("FIRECRAWL_API_URL", "https://api.firecrawl.dev/v1/scrape")
+
+
+class ScrapeError(RuntimeError):
+    pass
+
+
+def _pooled_session(pool_size: int):
+    import requests   # deferred: only the SME page scrapes
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# === Fetchers ===
+# fetch(url, timeout, validators) -> {"status": 200 | 304, "text", "etag", "last_modified"}.
+# validators holds the cached etag/last_modified; a fetcher that can't revalidate ignores them.
+class FirecrawlFetcher:
+    """Firecrawl's scrape API. It has no conditional requests, so cached pages only expire by TTL."""
+
+    def __init__(self, api_url: str = FIRECRAWL_API_URL, api_key: str = None, pool_size: int = SCRAPE_MAX_WORKERS):
+        self.api_url = api_url
+        self.api_key = api_key or os.getenv("firecrawl_api_key")
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                self._session = _pooled_session(self.pool_size)
+            return self._session
+
+    def fetch(self, url: str, timeout: float, validators: dict = None) -> dict:
+        response = self._get_session().post(
+            self.api_url,
+            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+            json={"url": url},
+            timeout=timeout,
+        )
+        if response.status_code != 200:
+            raise ScrapeError(f"Failed to scrape {url}: {response.text[:500]}")
+        data = response.json()
+        return {"status": 200, "text": data.get("content", {}).get("text", "")}
+
+
+class _TextExtractor(HTMLParser):
+    SKIP = {"script", "style", "noscript", "template"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping and data.strip():
+            self.parts.append(data.strip())
+
+
+def html_to_text(html: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(html)
+    return "\n".join(parser.parts)
+
+
+class HttpFetcher:
+    """Plain GET against the page itself, with If-None-Match / If-Modified-Since revalidation.
+    Used for sites that don't need a headless browser and for local stand-in servers."""
+
+    def __init__(self, pool_size: int = SCRAPE_MAX_WORKERS, user_agent: str = "IntelligentEvaluator/1.0"):
+        self.pool_size = pool_size
+        self.user_agent = user_agent
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                self._session = _pooled_session(self.pool_size)
+                self._session.headers["User-Agent"] = self.user_agent
+            return self._session
+
+    def fetch(self, url: str, timeout: float, validators: dict = None) -> dict:
+        headers = {}
+        if validators and validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators and validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        response = self._get_session().get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            return {"status": 304}
+        if response.status_code != 200:
+            raise ScrapeError(f"Failed to scrape {url}: HTTP {response.status_code}")
+        is_html = "html" in response.headers.get("Content-Type", "html")
+        return {
+            "status": 200,
+            "text": html_to_text(response.text) if is_html else response.text,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+
+FETCHERS = {"firecrawl": FirecrawlFetcher, "http": HttpFetcher}
+
+
+# === Cached, concurrent scraper ===
+class Scraper:
+    """Scrapes URLs concurrently through one fetcher, with an on-disk content cache.
+
+    Entries younger than `ttl` are served without a request. Older ones are revalidated
+    with the stored ETag/Last-Modified (a 304 just refreshes the timestamp); if the
+    revalidation fails, the stale copy is served rather than an error.
+    """
+
+    def __init__(self, fetcher=None, cache_dir: str = SCRAPE_CACHE_DIR, ttl: float = SCRAPE_CACHE_TTL,
+                 max_workers: int = SCRAPE_MAX_WORKERS, timeout: float = SCRAPE_TIMEOUT,
+                 max_bytes: int = SCRAPE_CACHE_MAX_BYTES):
+        self.fetcher = fetcher or FETCHERS[SCRAPE_FETCHER]()
+        self.cache = DiskCache(cache_dir, max_bytes=max_bytes) if cache_dir else None
+        self.ttl = ttl
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scraper")
+        self._stats_lock = threading.Lock()
+        self.counts = {"fresh": 0, "revalidated": 0, "fetched": 0, "stale": 0, "errors": 0}
+        self.fetch_time = 0.0
+
+    def _count(self, outcome: str, elapsed: float = 0.0):
+        with self._stats_lock:
+            self.counts[outcome] += 1
+            self.fetch_time += elapsed
+
+    def _key(self, url: str) -> str:
+        return stable_hash(type(self.fetcher).__name__, url)
+
+    def scrape(self, url: str) -> str:
+        key = self._key(url)
+        entry = self.cache.get(key) if self.cache is not None else None
+        if entry is not None and time.time() - entry["fetched_at"] < self.ttl:
+            self._count("fresh")
+            return entry["text"]
+
+        start = time.perf_counter()
+        try:
+            result = self.fetcher.fetch(url, self.timeout, entry)
+        except Exception as e:
+            if entry is not None:
+                print(f"Revalidating {url} failed, serving cached copy: {e}")
+                self._count("stale", time.perf_counter() - start)
+                return entry["text"]
+            self._count("errors", time.perf_counter() - start)
+            raise
+        elapsed = time.perf_counter() - start
+
+        if result["status"] == 304 and entry is not None:
+            entry["fetched_at"] = time.time()
+            self._count("revalidated", elapsed)
+        else:
+            entry = {
+                "url": url,
+                "text": result.get("text", ""),
+                "etag": result.get("etag"),
+                "last_modified": result.get("last_modified"),
+                "fetched_at": time.time(),
+            }
+            self._count("fetched", elapsed)
+        if self.cache is not None:
+            self.cache.set(key, entry)
+        return entry["text"]
+
+    def scrape_many(self, urls: list) -> list:
+        """Scrape every URL concurrently; returns [(url, text or exception)] in input order.
+        Duplicate URLs are fetched once."""
+        futures = {url: self._executor.submit(self.scrape, url) for url in dict.fromkeys(urls)}
+        results = []
+        for url in urls:
+            try:
+                results.append((url, futures[url].result()))
+            except Exception as e:
+                results.append((url, e))
+        return results
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            requests_made = self.counts["fetched"] + self.counts["revalidated"] + self.counts["stale"] + self.counts["errors"]
+            return {
+                **self.counts,
+                "avg_fetch_time": self.fetch_time / requests_made if requests_made else 0.0,
+            }
+
+
+_scraper = None
+_scraper_lock = threading.Lock()
+
+
+def get_scraper() -> Scraper:
+    global _scraper
+    if _scraper is None:
+        with _scraper_lock:
+            if _scraper is None:
+                _scraper = Scraper()
+    return _scraper
@@ -0,0 +1,88 @@
+import os
+import re
+import threading
+from collections import Counter
+
+from Questions import normalize_text
+
+# Content-word Jaccard at or above this settles an answer as correct without the model
+LEXICAL_ACCEPT = float(os.getenv("SHORT_ANSWER_LEXICAL_ACCEPT", 0.8))
+LEXICAL_FILTER = os.getenv("SHORT_ANSWER_LEXICAL", "1") != "0"
+
+TIERS = ("empty", "exact", "near_exact", "non_answer", "semantic")
+
+_WORD = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+    a an the and or but if then so of to in on at by for with from as into about than
+    is are was were be been being am do does did has have had it its this that these those
+    i me my we our you your he she they them their it's there here what which who whom how why when where
+    yes just very really maybe some any all can could would should will shall may might must
+""".split())
+
+# Negation flips meaning while barely moving word overlap, so answers that differ in it
+# never take the lexical accept path ("don't" and friends tokenize to "don", "t")
+NEGATIONS = frozenset("no not never nor neither none nothing nobody cannot without t".split())
+
+# Whole answers that say "I don't know" in one way or another
+NON_ANSWERS = frozenset(normalize_text(text) for text in (
+    "idk", "i dont know", "i don't know", "dont know", "don't know", "not sure", "no idea", "no clue",
+    "unknown", "n/a", "na", "none", "nothing", "pass", "skip", "?", "??", "???", "-", "...", "x", "test", "asdf",
+))
+
+
+def lexical_tokens(text) -> list:
+    """Word tokens of the normalized text; punctuation is dropped."""
+    return _WORD.findall(normalize_text(text))
+
+
+def lexical_verdict(answer, reference):
+    """Settle clear-cut short answers without embeddings: (score, tier), with score None
+    when only the semantic tier can decide.
+
+    The lexical tiers only fire where the embedding comparison at the 0.5 threshold is not
+    in doubt: same words (the model sees near-identical input), an empty or content-free
+    answer against a real reference, or a stock non-answer that shares no word with it.
+    """
+    tokens = lexical_tokens(answer)
+    ref_tokens = lexical_tokens(reference)
+    if not tokens:
+        return 0, "empty"
+    if tokens == ref_tokens:
+        return 1, "exact"
+    content = set(tokens) - STOPWORDS
+    ref_content = set(ref_tokens) - STOPWORDS
+    same_negation = set(tokens) & NEGATIONS == set(ref_tokens) & NEGATIONS
+    if same_negation and content and ref_content and len(content & ref_content) / len(content | ref_content) >= LEXICAL_ACCEPT:
+        return 1, "near_exact"
+    if ref_content and not content & ref_content and (not content or normalize_text(answer) in NON_ANSWERS):
+        return 0, "non_answer"
+    return None, "semantic"
+
+
+class TierStats:
+    """Counts of short answers settled by each tier, process-wide."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def record(self, tiers):
+        with self._lock:
+            self.counts.update(tiers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                "answers": total,
+                "counts": {tier: self.counts[tier] for tier in TIERS},
+                "shares": {tier: self.counts[tier] / total if total else 0.0 for tier in TIERS},
+            }
+
+
+_tier_stats = TierStats()
+
+
+def get_tier_stats() -> TierStats:
+    return _tier_stats